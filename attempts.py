@@ -0,0 +1,247 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from fastapi import HTTPException
+import psycopg2
+from database import get_db
+import cache
+import mastery
+import repository
+
+FLUSH_INTERVAL = float(os.getenv("EXAM_FLUSH_SECS", "1"))
+FLUSH_THRESHOLD = int(os.getenv("EXAM_FLUSH_ROWS", "2000"))          # pending answers that trigger an early flush
+MAX_PENDING = int(os.getenv("EXAM_MAX_PENDING_ROWS", "200000"))      # cap while the database is down
+MAX_SESSIONS = int(os.getenv("EXAM_MAX_SESSIONS", "5000"))           # live sessions per worker
+SWEEP_INTERVAL = float(os.getenv("EXAM_SWEEP_SECS", "30"))          # how often overdue attempts are closed
+SWEEP_GRACE = float(os.getenv("EXAM_SWEEP_GRACE_SECS", "30"))       # past the deadline, left for live sessions
+SWEEP_BATCH = 500
+MAX_MESSAGE_CHARS = 1024
+OPTIONS = {"A", "B", "C", "D"}
+
+
+class AnswerBuffer:
+    """Answer changes held in memory and flushed as batched upserts.
+
+    Keyed by (attempt_id, question_id), so a student changing an answer ten
+    times between flushes still costs one row.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def record(self, attempt_id, question_id, option):
+        with self._lock:
+            self._pending[(attempt_id, question_id)] = (option, datetime.now(timezone.utc))
+            size = len(self._pending)
+        if size >= FLUSH_THRESHOLD:
+            self._wake.set()
+
+    def pending_for(self, attempt_id):
+        """Unflushed {question_id: option} of one attempt"""
+        with self._lock:
+            return {qid: option for (aid, qid), (option, _) in self._pending.items() if aid == attempt_id}
+
+    def _merge_back(self, batch):
+        with self._lock:
+            for key, (option, answered_at) in batch.items():
+                current = self._pending.get(key)
+                if current is None and len(self._pending) >= MAX_PENDING:
+                    continue
+                if current is None or current[1] < answered_at:
+                    self._pending[key] = (option, answered_at)
+
+    def flush(self):
+        """Write everything pending in one transaction; returns the number of rows, None on failure"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            # Sorted so concurrent flushes from several workers lock rows in the same order
+            rows = sorted((aid, qid, option, answered_at) for (aid, qid), (option, answered_at) in batch.items())
+            try:
+                with get_db() as conn:
+                    with conn.cursor() as cur:
+                        repository.upsert_attempt_answers(cur, rows)
+                    conn.commit()
+            except Exception as e:
+                print(f"Answer flush failed, keeping {len(rows)} rows for retry: {str(e)}")
+                self._merge_back(batch)
+                return None
+            return len(rows)
+
+    def _run(self):
+        while True:
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="answer-flush", daemon=True)
+            self._thread.start()
+
+
+buffer = AnswerBuffer()
+
+
+class Session:
+    """One student's live attempt; memory is bounded by the exam's question count"""
+
+    __slots__ = ("attempt_id", "user_id", "exam_overview_id", "deadline", "answers", "answer_key")
+
+    def __init__(self, attempt, answers, answer_key):
+        self.attempt_id = attempt["attempt_id"]
+        self.user_id = attempt["user_id"]
+        self.exam_overview_id = attempt["exam_overview_id"]
+        # Monotonic deadline from the database's remaining time, immune to clock changes
+        self.deadline = time.monotonic() + float(attempt["remaining_secs"])
+        self.answers = answers
+        self.answer_key = answer_key
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def answer(self, question_id, option):
+        """Record an answer (None clears it); returns an error message or None"""
+        if self.remaining() <= 0:
+            return "Time is up"
+        if question_id not in self.answer_key:
+            return f"Question {question_id} is not part of this exam"
+        if option is not None:
+            option = str(option).strip().upper()
+            if option not in OPTIONS:
+                return f"Option must be one of {', '.join(sorted(OPTIONS))} or null"
+        if self.answers.get(question_id) != option:
+            self.answers[question_id] = option
+            buffer.record(self.attempt_id, question_id, option)
+        return None
+
+
+# attempt_id → (session, connection) of the sessions live in this worker
+_live = {}
+_live_lock = threading.Lock()
+
+
+def at_capacity():
+    return len(_live) >= MAX_SESSIONS
+
+
+def register(session, connection):
+    """Make this the attempt's live connection; returns the connection it replaces, if any"""
+    with _live_lock:
+        previous = _live.get(session.attempt_id)
+        _live[session.attempt_id] = (session, connection)
+    return previous[1] if previous else None
+
+
+def unregister(session, connection):
+    with _live_lock:
+        if _live.get(session.attempt_id, (None, None))[1] is connection:
+            del _live[session.attempt_id]
+
+
+def open_session(user_id, exam_overview_id):
+    """Resume or start the user's attempt.
+
+    Returns ("session", Session), or ("result", result) when the open attempt
+    ran out of time while the student was away.
+    """
+    answer_key = cache.answer_key(exam_overview_id)
+
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            exam = repository.get_exam(cur, exam_overview_id)
+            if not exam:
+                raise HTTPException(status_code=404, detail="Exam not found")
+            try:
+                attempt = repository.open_attempt(cur, user_id, exam_overview_id, exam["total_time_mins"])
+                if attempt is None:
+                    raise HTTPException(status_code=409, detail="Attempt is being closed, try again")
+                answers = repository.list_attempt_answers(cur, attempt["attempt_id"])
+                conn.commit()
+            except psycopg2.IntegrityError as e:
+                conn.rollback()
+                raise repository.integrity_error(e)
+
+    # Answers still in this worker's buffer are newer than what was flushed
+    answers.update(buffer.pending_for(attempt["attempt_id"]))
+    session = Session(attempt, {qid: option for qid, option in answers.items() if qid in answer_key}, answer_key)
+    if session.remaining() <= 0:
+        return "result", finish(session, "expired")
+    return "session", session
+
+
+def finish(session, status):
+    """Save pending answers, close and score the attempt and add it to the user's topic stats"""
+    if buffer.flush() is None:
+        raise HTTPException(status_code=503, detail="Could not save answers, try again")
+
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            attempt, closed_now = repository.finish_attempt(cur, session.attempt_id, status)
+            conn.commit()
+    if attempt is None:
+        # Deleted along with its exam or user while the session was open
+        raise HTTPException(status_code=404, detail="Attempt not found")
+
+    answered = {qid: option for qid, option in session.answers.items() if option is not None}
+    if closed_now:
+        for question_id, option in answered.items():
+            question = session.answer_key[question_id]
+            correct = option == question["correct_option"].strip().upper()
+            mastery.buffer.record(session.user_id, question["syllabus_id"], question["difficulty"], correct)
+
+    return {
+        "type": "result",
+        "attempt_id": attempt["attempt_id"],
+        "status": attempt["status"],
+        "score": attempt["score"],
+        "answered": len(answered),
+        "total_questions": len(session.answer_key),
+        "submitted_at": attempt["submitted_at"].isoformat() if attempt["submitted_at"] else None,
+    }
+
+
+def expire_overdue():
+    """Close and score one batch of attempts abandoned past their deadline; returns how many"""
+    # Answers buffered here for those attempts must land before they are scored
+    if buffer.flush() is None:
+        return 0
+
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            expired = repository.expire_overdue_attempts(cur, SWEEP_GRACE, SWEEP_BATCH)
+            results = repository.list_attempt_results(cur, [a["attempt_id"] for a in expired]) if expired else []
+            conn.commit()
+
+    for row in results:
+        mastery.buffer.record(row["user_id"], row["syllabus_id"], row["difficulty"], row["correct"])
+    return len(expired)
+
+
+def _sweep():
+    while True:
+        time.sleep(SWEEP_INTERVAL)
+        try:
+            while expire_overdue() == SWEEP_BATCH:
+                pass
+        except Exception as e:
+            print(f"Attempt sweep failed: {str(e)}")
+
+
+_sweeper = None
+
+
+def start_sweeper():
+    """Enforce deadlines for students who disconnected and never came back"""
+    global _sweeper
+    if _sweeper is None:
+        _sweeper = threading.Thread(target=_sweep, name="attempt-sweep", daemon=True)
+        _sweeper.start()
@@ -0,0 +1,100 @@
+"""Latency of the hot question queries vs. inactive rows kept in or archived out of `questions`.
+
+Usage: python benchmarks/archive_latency.py [iterations]
+Copies `questions` and `questions_archive` into a scratch schema that shadows
+them on a dedicated connection, adds synthetic inactive questions there and
+drops the schema afterwards, so the database configured in .env is left
+unchanged. Every step is committed and vacuumed, so "archived" measures a hot
+table that has really shrunk rather than one still holding dead tuples.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from database import DB_CONFIG
+import repository
+
+INACTIVE_ROWS = [0, 10_000, 50_000, 200_000]
+SCHEMA = "bench_archive"
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def create_scratch(cur):
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    for table in ("questions", "questions_archive"):
+        cur.execute(f"CREATE TABLE {SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)")
+        cur.execute(f"INSERT INTO {SCHEMA}.{table} OVERRIDING SYSTEM VALUE SELECT * FROM public.{table}")
+    cur.execute(f"""
+        SELECT setval(pg_get_serial_sequence('{SCHEMA}.questions', 'question_id'),
+                      (SELECT COALESCE(MAX(question_id), 0) + 1 FROM public.questions), false)
+    """)
+    # The scratch tables now shadow the real ones for every query in this session
+    cur.execute(f"SET search_path TO {SCHEMA}, public")
+
+
+def vacuum(cur):
+    cur.execute("VACUUM ANALYZE questions")
+    cur.execute("VACUUM ANALYZE questions_archive")
+    cur.execute("SELECT pg_relation_size('questions') AS bytes")
+    return cur.fetchone()["bytes"]
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    conn = psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
+    conn.autocommit = True  # VACUUM can't run in a transaction block
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT syllabus_id, exam_overview_id FROM syllabus ORDER BY syllabus_id LIMIT 1")
+            topic = cur.fetchone()
+            if not topic:
+                print("Need at least one syllabus row to attach synthetic questions to")
+                return
+
+            create_scratch(cur)
+
+            def all_questions():
+                repository.list_questions(cur)
+
+            def overview():
+                repository.get_exam_overview(cur, topic["exam_overview_id"])
+
+            print(f"{'inactive rows':>14} {'location':>9} {'heap':>9} {'GET /questions':>15} {'overview':>10}")
+            for target in INACTIVE_ROWS:
+                # Rows archived in the previous round are back to zero inactive ones in the hot table
+                cur.execute("TRUNCATE questions_archive")
+                cur.execute("""
+                    INSERT INTO questions
+                    (syllabus_id, difficulty, question_text, option_a, option_b,
+                     option_c, option_d, correct_option, is_active)
+                    SELECT %s, 'easy', 'synthetic ' || g, 'a', 'b', 'c', 'd', 'A', FALSE
+                    FROM generate_series(1, %s) g
+                """, (topic["syllabus_id"], target))
+
+                for location in ("hot", "archived"):
+                    if location == "archived":
+                        while repository.archive_questions(cur, batch_size=50_000):
+                            pass
+                    heap_mb = vacuum(cur) / 1024 / 1024
+                    print(f"{target:>14} {location:>9} {heap_mb:>6.1f} MB "
+                          f"{timed(all_questions, iterations):>12.2f} ms "
+                          f"{timed(overview, iterations):>7.2f} ms")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
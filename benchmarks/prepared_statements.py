@@ -0,0 +1,57 @@
+"""Per-call latency of the hot lookups with and without server-side preparation.
+
+Usage: python benchmarks/prepared_statements.py [iterations]
+Runs against the database configured in .env and only issues SELECTs.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db
+import repository  # noqa: F401  registers the statements
+import statements
+
+
+def bench(label, fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    per_call = (time.perf_counter() - start) / iterations * 1e6
+    print(f"{label:<32} {per_call:8.1f} us/call")
+    return per_call
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT MIN(exam_overview_id) AS id FROM exam_overview")
+            exam_id = cur.fetchone()["id"] or 1
+
+            for name in ("exam_by_id", "sections_by_exam"):
+                sql = STATEMENT_SQL[name]
+
+                def plain():
+                    cur.execute(sql, (exam_id,))
+                    cur.fetchall()
+
+                def prepared():
+                    statements.execute(cur, name, (exam_id,))
+                    cur.fetchall()
+
+                plain()
+                prepared()
+                before = bench(f"{name} (plain)", plain, iterations)
+                after = bench(f"{name} (prepared)", prepared, iterations)
+                print(f"{'':<32} {before - after:8.1f} us saved ({(1 - after / before) * 100:.0f}%)")
+            conn.rollback()
+
+
+# Same text as the registry, using client-side %s placeholders
+STATEMENT_SQL = {name: sql.replace("$1", "%s") for name, (_, sql) in statements.STATEMENTS.items()}
+
+if __name__ == "__main__":
+    main()
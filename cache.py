@@ -0,0 +1,189 @@
+import itertools
+import json
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+import psycopg2
+import psycopg2.extensions
+import database
+from database import get_db
+import repository
+
+CACHE_TTL = float(os.getenv("CACHE_TTL_SECS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))  # per cache, least recently used evicted
+CHANNEL = "olympiad_changes"
+LISTEN_RETRY_SECS = float(os.getenv("CACHE_LISTEN_RETRY_SECS", "5"))
+LISTEN_KEEPALIVE_SECS = 30
+MAX_NOTIFY_IDS = 500   # more changed ids than this are sent as a change of the whole exam (NOTIFY payloads are < 8000 bytes)
+
+# Every cache by name, so invalidations can be addressed by name
+CACHES = {}
+
+# table → callbacks taking the changed exam_overview_id (None = unknown/all), the
+# changed row ids (None = unknown) and the change's token from publish()
+_subscribers = {}
+
+# Tokens are unique across workers, so a worker can recognize its own changes
+_origin = os.urandom(6).hex()
+_sequence = itertools.count(1)
+
+
+def subscribe(table, callback):
+    _subscribers.setdefault(table, []).append(callback)
+
+
+def _dispatch(table, key, ids=None, change=None):
+    for callback in _subscribers.get(table, []):
+        callback(key, ids, change)
+
+
+def publish(cur, table, exam_overview_id=None, ids=None):
+    """Invalidate this worker now and every worker once the transaction commits.
+
+    Call before conn.commit(); NOTIFY is only delivered if the write commits.
+    ids optionally names the changed rows. Returns the change's token, which
+    arrives again with this worker's own NOTIFY.
+    """
+    change = f"{_origin}-{next(_sequence)}"
+    if ids is not None:
+        ids = list(ids)
+        if len(ids) > MAX_NOTIFY_IDS:
+            ids = None
+    _dispatch(table, exam_overview_id, ids, change)
+    cur.execute("SELECT pg_notify(%s, %s)",
+                (CHANNEL, json.dumps({"table": table, "key": exam_overview_id, "ids": ids, "change": change})))
+    return change
+
+
+class TTLCache:
+    """Thread-safe in-process cache whose entries expire after ttl seconds.
+
+    depends_on lists the tables whose changes invalidate it; with per_exam the
+    cache is keyed by exam_overview_id and only the changed exam is dropped.
+    At most max_size entries are kept, expired ones are swept once per ttl, and
+    empty values (e.g. for ids that don't exist) are only kept with keep_empty.
+    """
+
+    def __init__(self, name, depends_on=(), per_exam=False, ttl=CACHE_TTL, max_size=CACHE_MAX_ENTRIES,
+                 keep_empty=True):
+        self.name = name
+        self.ttl = ttl
+        self.per_exam = per_exam
+        self.max_size = max_size
+        self.keep_empty = keep_empty
+        self._entries = OrderedDict()
+        self._next_sweep = time.monotonic() + ttl
+        self._generation = 0
+        self._lock = threading.Lock()
+        CACHES[name] = self
+        for table in depends_on:
+            subscribe(table, self._on_change)
+
+    def _on_change(self, exam_overview_id, ids=None, change=None):
+        self.invalidate(exam_overview_id if self.per_exam else None)
+
+    def get(self, key, loader):
+        """Cached value for key, calling loader() to fill a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            generation = self._generation
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+        value = loader()
+        if not value and not self.keep_empty:
+            return value
+        with self._lock:
+            # Don't store a value loaded before an invalidation landed
+            if generation == self._generation:
+                self._store(key, value, now)
+        return value
+
+    def _store(self, key, value, now):
+        self._entries[key] = (now + self.ttl, value)
+        self._entries.move_to_end(key)
+        if now >= self._next_sweep:
+            for expired in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[expired]
+            self._next_sweep = now + self.ttl
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None"""
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+def flush_all():
+    for cache in CACHES.values():
+        cache.invalidate()
+
+
+exam_catalog = TTLCache("exam_catalog", depends_on=["exam_overview"])
+# Keyed by ids from request URLs, so missing exams aren't cached
+answer_keys = TTLCache("answer_keys", per_exam=True, keep_empty=False,
+                       depends_on=["exam_overview", "sections", "syllabus", "questions"])
+
+
+def _read(fn, *args):
+    # Fill from the primary so a refill right after a NOTIFY can't read a lagging replica
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            return fn(cur, *args)
+
+
+def exams():
+    return exam_catalog.get("all", lambda: _read(repository.list_exams))
+
+
+def answer_key(exam_overview_id):
+    return answer_keys.get(exam_overview_id, lambda: _read(repository.get_answer_key, exam_overview_id))
+
+
+def _connect_listener():
+    conn = psycopg2.connect(**database.DB_CONFIG)
+    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {CHANNEL}")
+    # Changes made while we weren't listening were never delivered
+    flush_all()
+    return conn
+
+
+def _listen(conn):
+    while True:
+        try:
+            if conn is None:
+                conn = _connect_listener()
+            if select.select([conn], [], [], LISTEN_KEEPALIVE_SECS) == ([], [], []):
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")  # notice a dead connection while idle
+                continue
+            conn.poll()
+            while conn.notifies:
+                payload = json.loads(conn.notifies.pop(0).payload)
+                _dispatch(payload["table"], payload["key"], payload.get("ids"), payload.get("change"))
+        except Exception as e:
+            print(f"Cache listener error, reconnecting: {str(e)}")
+            if conn is not None:
+                conn.close()
+                conn = None
+            time.sleep(LISTEN_RETRY_SECS)
+
+
+def start_listener():
+    """Subscribe this worker to change notifications from every other worker"""
+    try:
+        conn = _connect_listener()
+    except psycopg2.Error as e:
+        print(f"Cache listener not connected yet: {str(e)}")
+        conn = None
+    threading.Thread(target=_listen, args=(conn,), name="cache-listener", daemon=True).start()
@@ -1,8 +1,17 @@
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+import psycopg2.sql
 from psycopg2.extras import RealDictCursor
 from contextlib import contextmanager
+import contextvars
+import random
+import select
+import threading
+import time
 import os
 from dotenv import load_dotenv
+import slowlog
 
 # Load environment variables
 load_dotenv()
@@ -12,13 +21,319 @@ DB_CONFIG = {
     "port": os.getenv("DB_PORT", "5432"),
     "database": os.getenv("DB_NAME"),
     "user": os.getenv("DB_USER"),
-    "password": os.getenv("DB_PASSWORD")
+    "password": os.getenv("DB_PASSWORD"),
+    # An unreachable host fails fast instead of hanging startup and the health checks
+    "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", "5")),
 }
 
+# Read replicas share the primary's database and credentials.
+# DB_REPLICA_HOSTS is a comma separated list of host[:port] entries.
+REPLICA_CONFIGS = []
+for _entry in filter(None, (h.strip() for h in os.getenv("DB_REPLICA_HOSTS", "").split(","))):
+    _host, _, _port = _entry.partition(":")
+    REPLICA_CONFIGS.append({**DB_CONFIG, "host": _host, "port": _port or DB_CONFIG["port"]})
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))            # idle connections kept open per pool
+POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))             # hard cap on connections per pool
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))   # seconds to wait for a free connection
+REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG_SECS", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_SECS", "2"))
+
+# Seconds of replay lag; 0 when the replica has applied everything it received
+# and NULL-safe when pointed at a server that is not in recovery. lsn is how far
+# it has replayed the primary's WAL.
+REPLICA_LAG_SQL = """
+    SELECT CASE
+             WHEN NOT pg_is_in_recovery() THEN 0
+             WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+             ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+           END AS lag,
+           CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn()
+                ELSE pg_current_wal_lsn()
+           END::text AS lsn
+"""
+
+
+class Connection(psycopg2.extensions.connection):
+    """Connection that remembers which server-side statements it has prepared.
+
+    With track_writes, a commit of a transaction that wrote records the WAL
+    position after it for the request, see _note_commit().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.track_writes = False
+
+    def commit(self):
+        if not self.track_writes or self.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+            return super().commit()
+        # Plain cursors so the bookkeeping is never logged as a slow query
+        with self.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+            cur.execute("SELECT txid_current_if_assigned() IS NOT NULL")
+            wrote = cur.fetchone()[0]
+        super().commit()
+        if wrote:
+            with self.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                cur.execute("SELECT pg_current_wal_insert_lsn()::text")
+                _note_commit(cur.fetchone()[0])
+
+
+class TimedCursor(RealDictCursor):
+    """Dict cursor that logs statements slower than SLOW_QUERY_MS, with a sampled plan"""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        result = super().execute(query, vars)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms >= slowlog.SLOW_QUERY_MS:
+            self._log_slow(query, vars, elapsed_ms)
+        return result
+
+    def _log_slow(self, query, vars, elapsed_ms):
+        # Log the statement with its placeholders (slowlog redacts any inlined literals);
+        # only the EXPLAIN sees the bound values
+        if isinstance(query, psycopg2.sql.Composable):
+            query = query.as_string(self)
+        if isinstance(query, bytes):
+            query = query.decode("utf-8", "replace")
+        plan = None
+        if slowlog.should_explain(query):
+            plan = self._explain(self.mogrify(query, vars).decode("utf-8", "replace"))
+        slowlog.record(query, vars, elapsed_ms, plan)
+
+    def _explain(self, statement):
+        conn = self.connection
+        if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+            return None
+        # Separate plain cursor so the EXPLAIN itself is never logged, and a savepoint
+        # so a failing EXPLAIN can't abort the caller's transaction
+        with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+            try:
+                cur.execute("SAVEPOINT slowlog_explain")
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement)
+                plan = "\n".join(row[0] for row in cur.fetchall())
+                cur.execute("RELEASE SAVEPOINT slowlog_explain")
+                return plan
+            except psycopg2.Error as e:
+                cur.execute("ROLLBACK TO SAVEPOINT slowlog_explain")
+                slowlog.note_explain_error(e)
+                return None
+
+
+def _usable(conn):
+    """Whether an idle pooled connection is still open, checked without a round trip.
+
+    An idle connection has nothing to read unless the server has closed it or
+    is about to (e.g. "terminating connection due to administrator command").
+    """
+    if conn.closed:
+        return False
+    try:
+        readable, _, _ = select.select([conn], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not readable
+
+
+class Pool:
+    """Lazily created, blocking connection pool for one Postgres server"""
+
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.healthy = True
+        self.lag = None
+        self.replay_lsn = 0
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(POOL_MAX)
+
+    def open(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    POOL_SIZE, POOL_MAX, **self.config,
+                    connection_factory=Connection, cursor_factory=TimedCursor
+                )
+        return self._pool
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=POOL_TIMEOUT):
+            raise psycopg2.pool.PoolError(f"No free connection in {self.name} pool")
+        try:
+            pool = self.open()
+            # After a restart or failover idle connections are dead without knowing it;
+            # hand out a live one rather than fail the request's first statement
+            for _ in range(POOL_MAX + 1):
+                conn = pool.getconn()
+                if _usable(conn):
+                    return conn
+                pool.putconn(conn, close=True)
+            raise psycopg2.pool.PoolError(f"No usable connection in {self.name} pool")
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            if not conn.closed and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            conn.close()
+        finally:
+            pool = self._pool
+            try:
+                if pool is None:
+                    conn.close()  # returned after close(), e.g. by a job that outlived shutdown
+                else:
+                    pool.putconn(conn, close=bool(conn.closed))
+            finally:
+                self._slots.release()
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+
+primary = Pool("primary", DB_CONFIG)
+replicas = [Pool(f"replica-{i}", config) for i, config in enumerate(REPLICA_CONFIGS)]
+
+# Read-your-writes state of the current request, bound by main.py: the WAL
+# position its reads must see (sent back by the client as X-Read-After after
+# its last write) and the position after its own latest commit
+_request = contextvars.ContextVar("db_request", default=None)
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def parse_lsn(text):
+    """A Postgres LSN such as "16/B374D848" as an int; 0 for anything else"""
+    high, sep, low = (text or "").strip().partition("/")
+    try:
+        return (int(high, 16) << 32) + int(low, 16) if sep else 0
+    except ValueError:
+        return 0
+
+
+def format_lsn(lsn):
+    return f"{lsn >> 32:X}/{lsn & 0xFFFFFFFF:X}"
+
+
+def bind_request(read_after=None):
+    return _request.set({"read_after": parse_lsn(read_after), "committed": 0})
+
+
+def unbind_request(token):
+    _request.reset(token)
+
+
+def committed_lsn():
+    """WAL position after this request's last committed write, for its X-Read-After header; None without one"""
+    state = _request.get()
+    return format_lsn(state["committed"]) if state and state["committed"] else None
+
+
+def _note_commit(lsn):
+    # The state dict is shared with the threadpool copies of the request's context
+    state = _request.get()
+    if state is not None:
+        lsn = parse_lsn(lsn)
+        state["committed"] = max(state["committed"], lsn)
+        state["read_after"] = max(state["read_after"], lsn)
+
+
+def _read_after():
+    state = _request.get()
+    return state["read_after"] if state else 0
+
+
+def is_pinned():
+    """Whether a replica in rotation hasn't replayed this request's client's last write yet"""
+    lsn = _read_after()
+    return bool(lsn) and any(r.healthy and r.replay_lsn < lsn for r in replicas)
+
+
+def _choose_pool(readonly):
+    if not readonly or not replicas:
+        return primary
+    _start_replica_monitor()
+    lsn = _read_after()
+    candidates = [r for r in replicas if r.healthy and r.replay_lsn >= lsn]
+    return random.choice(candidates) if candidates else primary
+
+
+def _check_replica(replica):
+    try:
+        conn = replica.getconn()
+    except Exception as e:
+        print(f"Replica {replica.name} unavailable: {str(e)}")
+        replica.healthy = False
+        return
+    try:
+        with conn.cursor() as cur:
+            cur.execute(REPLICA_LAG_SQL)
+            row = cur.fetchone()
+            replica.lag = float(row["lag"])
+            replica.replay_lsn = parse_lsn(row["lsn"])
+        replica.healthy = replica.lag <= REPLICA_MAX_LAG
+        if not replica.healthy:
+            print(f"Replica {replica.name} lagging by {replica.lag:.1f}s, out of rotation")
+    except psycopg2.Error as e:
+        print(f"Replica {replica.name} check failed: {str(e)}")
+        replica.healthy = False
+        conn.close()
+    finally:
+        replica.putconn(conn)
+
+
+def _monitor_replicas():
+    while True:
+        for replica in replicas:
+            _check_replica(replica)
+        time.sleep(REPLICA_CHECK_INTERVAL)
+
+
+def _start_replica_monitor():
+    global _monitor
+    if _monitor is None and replicas:
+        with _monitor_lock:
+            if _monitor is None:
+                for replica in replicas:
+                    _check_replica(replica)
+                _monitor = threading.Thread(target=_monitor_replicas, name="replica-monitor", daemon=True)
+                _monitor.start()
+
+
+def replica_status():
+    """Health and measured lag of every configured replica"""
+    return [
+        {"name": r.name, "host": r.config["host"], "healthy": r.healthy, "lag_secs": r.lag}
+        for r in replicas
+    ]
+
+
 @contextmanager
-def get_db():
-    conn = psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
+def get_db(readonly=False):
+    """Pooled connection; readonly=True routes to a healthy replica when one is configured"""
+    pool = _choose_pool(readonly)
+    try:
+        conn = pool.getconn()
+    except (psycopg2.OperationalError, psycopg2.pool.PoolError) as e:
+        if pool is primary:
+            raise
+        print(f"Replica {pool.name} unavailable, falling back to primary: {str(e)}")
+        if isinstance(e, psycopg2.OperationalError):
+            pool.healthy = False
+        pool = primary
+        conn = pool.getconn()
+    # Only primary commits inside a request need their WAL position
+    conn.track_writes = pool is primary and bool(replicas) and _request.get() is not None
     try:
         yield conn
     finally:
-        conn.close()
\ No newline at end of file
+        conn.track_writes = False
+        pool.putconn(conn)
@@ -0,0 +1,322 @@
+import collections
+import hashlib
+import os
+import random
+import re
+import threading
+import cache
+from database import get_db
+import repository
+
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))  # estimated Jaccard similarity counted as a duplicate
+NUM_PERM = 60
+BANDS = 12                 # 12 bands of 5 rows: ~99% of pairs at 0.8 share a bucket, ~5% at 0.3
+ROWS = NUM_PERM // BANDS
+SHINGLE = 5                # characters per shingle
+BACKFILL_SECS = float(os.getenv("DEDUP_BACKFILL_SECS", "60"))  # idle wait between checks for unsigned questions
+BACKFILL_BATCH = 200
+APPLIED_CHANGES = 256      # tokens of own changes remembered until their NOTIFY comes back
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)  # fixed seed so signatures are comparable across workers and restarts
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def _normalize(text):
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def signature(question):
+    """MinHash signature of a question's text plus its options (in any order).
+
+    question is a mapping or model with question_text and option_a..option_d.
+    Only the low byte of each minimum is kept (b-bit MinHash): 60 bytes per
+    question, compared with a single XOR.
+    """
+    get = question.get if isinstance(question, dict) else lambda name: getattr(question, name)
+    options = sorted(_normalize(get(name)) for name in ("option_a", "option_b", "option_c", "option_d"))
+    text = " | ".join([_normalize(get("question_text"))] + options)
+
+    shingles = {text[i:i + SHINGLE] for i in range(max(len(text) - SHINGLE + 1, 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingles]
+    return bytes(min((a * h + b) % _PRIME for h in hashes) & 0xFF for a, b in _PERMS)
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity from the share of equal MinHash bytes"""
+    diff = (int.from_bytes(sig_a, "big") ^ int.from_bytes(sig_b, "big")).to_bytes(NUM_PERM, "big")
+    equal = diff.count(0) / NUM_PERM
+    # Unrelated bytes still collide 1 time in 256
+    return max(0.0, (equal - 1 / 256) / (1 - 1 / 256))
+
+
+def _bands(sig):
+    return [(band, sig[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+
+class ExamIndex:
+    """LSH index of the active questions of one exam.
+
+    Questions sharing any band of their signature land in the same bucket, so a
+    lookup only compares against those candidates instead of the whole exam.
+
+    Changes naming their questions are caught up by fetching just those rows;
+    only a change of unknown scope makes the whole index stale. A worker's own
+    inserts are applied with add() and not fetched again when their NOTIFY
+    comes back.
+    """
+
+    def __init__(self, exam_overview_id):
+        self.exam_overview_id = exam_overview_id
+        self.stale = True
+        self._generation = 0
+        self._pending = set()   # question_ids changed since the last sync
+        self._applied = collections.OrderedDict()  # tokens of changes add() already applied
+        self._signatures = {}   # question_id → signature
+        self._syllabus = {}     # question_id → syllabus_id
+        self._added_at = {}     # question_id → _version when add() last applied it
+        self._buckets = {}      # (band, band bytes) → {question_id}
+        self._version = 0
+        self._clusters = None   # (version, threshold, result) of the last clusters() call
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def mark_stale(self):
+        with self._lock:
+            self.stale = True
+            self._generation += 1
+
+    def mark_changed(self, question_ids, change=None):
+        with self._lock:
+            if change is not None and self._applied.pop(change, None):
+                return
+            self._pending.update(question_ids)
+
+    def add(self, question_id, syllabus_id, sig, change=None):
+        """Index a question this worker committed; change is the token publish() returned for it"""
+        with self._lock:
+            self._add(question_id, syllabus_id, sig)
+            self._added_at[question_id] = self._version
+            if change is not None:
+                self._pending.discard(question_id)
+                self._applied[change] = True
+                while len(self._applied) > APPLIED_CHANGES:
+                    self._applied.popitem(last=False)
+
+    def _add(self, question_id, syllabus_id, sig):
+        if question_id in self._signatures:
+            self._remove(question_id)
+        self._version += 1
+        self._signatures[question_id] = sig
+        self._syllabus[question_id] = syllabus_id
+        for key in _bands(sig):
+            self._buckets.setdefault(key, set()).add(question_id)
+
+    def _remove(self, question_id):
+        sig = self._signatures.pop(question_id)
+        del self._syllabus[question_id]
+        self._added_at.pop(question_id, None)
+        self._version += 1
+        for key in _bands(sig):
+            bucket = self._buckets[key]
+            bucket.discard(question_id)
+            if not bucket:
+                del self._buckets[key]
+
+    def sync(self, cur):
+        """Catch up with the database, loading stored signatures of questions not seen yet.
+
+        Questions stored without one (from before signatures were kept, or restored
+        from the archive) are left out until the backfill thread signs them.
+        """
+        with self._sync_lock:
+            with self._lock:
+                if not self.stale and not self._pending:
+                    return
+                stale, generation, since = self.stale, self._generation, self._version
+                pending, self._pending = self._pending, set()
+            try:
+                if stale:
+                    self._sync_all(cur, generation, since)
+                else:
+                    self._sync_changed(cur, pending, since)
+            except BaseException:
+                with self._lock:
+                    self._pending |= pending
+                raise
+
+    def _added_after(self, question_id, since):
+        # add() applied a committed insert after our read started, so the read may predate it
+        return self._added_at.get(question_id, 0) > since
+
+    def _sync_all(self, cur, generation, since):
+        current = repository.list_exam_question_ids(cur, self.exam_overview_id)
+        with self._lock:
+            missing = [qid for qid in current if qid not in self._signatures]
+        rows = repository.get_question_signatures(cur, missing) if missing else []
+
+        added = [(row["question_id"], row["syllabus_id"], bytes(row["text_signature"]))
+                 for row in rows if row["text_signature"] is not None]
+        if len(added) < len(rows):
+            _backfill_wake.set()
+        with self._lock:
+            for question_id in [qid for qid in self._signatures if qid not in current]:
+                if not self._added_after(question_id, since):
+                    self._remove(question_id)
+            for question_id, syllabus_id, sig in added:
+                if question_id in current and not self._added_after(question_id, since):
+                    self._add(question_id, syllabus_id, sig)
+            # A change that landed while we were reading needs another pass
+            if generation == self._generation:
+                self.stale = False
+
+    def _sync_changed(self, cur, question_ids, since):
+        rows = repository.get_active_question_signatures(cur, self.exam_overview_id, question_ids)
+        found = {row["question_id"]: row for row in rows}
+        if any(row["text_signature"] is None for row in rows):
+            _backfill_wake.set()
+        with self._lock:
+            for question_id in question_ids:
+                if self._added_after(question_id, since):
+                    continue
+                row = found.get(question_id)
+                if row is not None and row["text_signature"] is not None:
+                    self._add(question_id, row["syllabus_id"], bytes(row["text_signature"]))
+                elif question_id in self._signatures:
+                    self._remove(question_id)
+
+    def matches(self, sig, threshold=DEDUP_THRESHOLD):
+        """Indexed questions at least threshold-similar to sig, most similar first"""
+        with self._lock:
+            candidates = set()
+            for key in _bands(sig):
+                candidates |= self._buckets.get(key, set())
+            found = [
+                {"question_id": qid, "syllabus_id": self._syllabus[qid],
+                 "similarity": round(similarity(sig, self._signatures[qid]), 3)}
+                for qid in candidates
+            ]
+        found = [m for m in found if m["similarity"] >= threshold]
+        found.sort(key=lambda m: (-m["similarity"], m["question_id"]))
+        return found
+
+    def clusters(self, threshold=DEDUP_THRESHOLD):
+        """Groups of questions linked by pairwise similarity at or above threshold"""
+        with self._lock:
+            version = self._version
+            if self._clusters and self._clusters[:2] == (version, threshold):
+                return self._clusters[2]
+            signatures = dict(self._signatures)
+            syllabus = dict(self._syllabus)
+            buckets = {key: set(bucket) for key, bucket in self._buckets.items() if len(bucket) > 1}
+
+        parent = {}
+
+        def find(qid):
+            while parent.get(qid, qid) != qid:
+                qid = parent[qid]
+            return qid
+
+        lowest = {}
+        for qid in sorted(signatures):
+            sig = signatures[qid]
+            candidates = set()
+            for key in _bands(sig):
+                candidates |= buckets.get(key, set())
+            # Each pair once, and none already known to be in the same cluster
+            for other in sorted(c for c in candidates if c > qid):
+                root_a, root_b = find(qid), find(other)
+                if root_a == root_b:
+                    continue
+                score = similarity(sig, signatures[other])
+                if score < threshold:
+                    continue
+                root = parent[max(root_a, root_b)] = min(root_a, root_b)
+                lowest[root] = min(score, lowest.pop(root_a, 1.0), lowest.pop(root_b, 1.0))
+
+        groups = {}
+        for qid in parent:
+            groups.setdefault(find(qid), {find(qid)}).add(qid)
+        result = [
+            {"questions": [{"question_id": qid, "syllabus_id": syllabus[qid]} for qid in sorted(members)],
+             "min_similarity": round(lowest.get(root, 1.0), 3)}
+            for root, members in groups.items()
+        ]
+        result.sort(key=lambda c: (-len(c["questions"]), c["questions"][0]["question_id"]))
+        with self._lock:
+            self._clusters = (version, threshold, result)
+        return result
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index_for(cur, exam_overview_id):
+    """The exam's index, brought up to date through the caller's cursor"""
+    with _indexes_lock:
+        index = _indexes.get(exam_overview_id)
+        if index is None:
+            index = _indexes[exam_overview_id] = ExamIndex(exam_overview_id)
+    index.sync(cur)
+    return index
+
+
+def _on_change(exam_overview_id, ids=None, change=None):
+    # Writes name the exam they touched, and the questions when they know them;
+    # None (a change of unknown scope) marks every index, or all of one exam's
+    with _indexes_lock:
+        indexes = list(_indexes.values()) if exam_overview_id is None else \
+            [i for i in [_indexes.get(exam_overview_id)] if i is not None]
+    for index in indexes:
+        if ids is None:
+            index.mark_stale()
+        else:
+            index.mark_changed(ids, change)
+
+
+for _table in ("exam_overview", "sections", "syllabus", "questions", "question_signatures"):
+    cache.subscribe(_table, _on_change)
+
+
+def backfill():
+    """Sign one batch of questions stored without a signature; returns how many.
+
+    Question text and options can't be edited, so a stored signature never goes stale.
+    """
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            rows = repository.lock_unsigned_questions(cur, BACKFILL_BATCH)
+            if rows:
+                repository.set_question_signatures(cur, [(row["question_id"], signature(row)) for row in rows])
+                signed = {}
+                for row in rows:
+                    signed.setdefault(row["exam_overview_id"], []).append(row["question_id"])
+                for exam_overview_id, question_ids in signed.items():
+                    cache.publish(cur, "question_signatures", exam_overview_id, question_ids)
+            conn.commit()
+    return len(rows)
+
+
+_backfill_wake = threading.Event()
+_backfill_thread = None
+
+
+def _run_backfill():
+    while True:
+        try:
+            while backfill() == BACKFILL_BATCH:
+                pass
+        except Exception as e:
+            print(f"Signature backfill failed: {str(e)}")
+        _backfill_wake.wait(BACKFILL_SECS)
+        _backfill_wake.clear()
+
+
+def start_backfill():
+    """Sign unsigned questions in the background, never on a request"""
+    global _backfill_thread
+    if _backfill_thread is None:
+        _backfill_thread = threading.Thread(target=_run_backfill, name="dedup-backfill", daemon=True)
+        _backfill_thread.start()
@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+from psycopg2.extras import Json
+from pydantic import ValidationError
+from database import get_db
+import slowlog
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))            # worker threads per process
+JOB_POLL_SECS = float(os.getenv("JOB_POLL_SECS", "2"))      # idle wait between claims
+JOB_LEASE_SECS = int(os.getenv("JOB_LEASE_SECS", "300"))    # a running job not heard from this long is reclaimed
+JOB_STOP_SECS = float(os.getenv("JOB_STOP_SECS", "10"))     # shutdown wait for running jobs
+
+JOB_COLUMNS = """job_id, kind, payload, status, progress, message, attempts,
+                 max_attempts, result, created_at, updated_at"""
+
+# kind → function(job) running the job; registered with @handler
+HANDLERS = {}
+# kind → pydantic model its payload must match
+PAYLOADS = {}
+# kind → function(cur, payload) raising HTTPException to refuse queueing it
+CHECKS = {}
+
+_wake = threading.Event()
+_stop = threading.Event()
+_workers = []
+
+
+def handler(kind, payload, check=None):
+    def register(fn):
+        HANDLERS[kind] = fn
+        PAYLOADS[kind] = payload
+        if check is not None:
+            CHECKS[kind] = check
+        return fn
+    return register
+
+
+def parse_payload(kind, payload):
+    """The payload normalized by its kind's model; raises pydantic.ValidationError"""
+    return PAYLOADS[kind].model_validate(payload).model_dump()
+
+
+class Job:
+    """A claimed job as seen by its handler"""
+
+    def __init__(self, row):
+        self.job_id = row["job_id"]
+        self.kind = row["kind"]
+        self.payload = row["payload"]
+        self.attempts = row["attempts"]
+        self.max_attempts = row["max_attempts"]
+
+    def report(self, progress, message=None):
+        """Record progress (0-100) and extend the lease; raises once the lease was lost to another worker"""
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE jobs
+                    SET progress = %s, message = COALESCE(%s, message),
+                        locked_until = NOW() + make_interval(secs => %s), updated_at = NOW()
+                    WHERE job_id = %s AND status = 'running' AND attempts = %s
+                """, (progress, message, JOB_LEASE_SECS, self.job_id, self.attempts))
+                renewed = cur.rowcount
+            conn.commit()
+        if not renewed:
+            raise RuntimeError("Lease lost to another worker")
+
+
+def enqueue(cur, kind, payload, max_attempts=3):
+    """Insert a queued job in the caller's transaction; returns its row.
+
+    Call wake() once that transaction has committed, before then a worker
+    can't see the job yet.
+    """
+    cur.execute(f"""
+        INSERT INTO jobs (kind, payload, max_attempts)
+        VALUES (%s, %s, %s)
+        RETURNING {JOB_COLUMNS}
+    """, (kind, Json(payload), max_attempts))
+    return cur.fetchone()
+
+
+def wake():
+    """Have an idle worker in this process look for jobs now instead of after its poll"""
+    _wake.set()
+
+
+def get_job(cur, job_id):
+    cur.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE job_id = %s", (job_id,))
+    return cur.fetchone()
+
+
+def _claim():
+    """Take the oldest runnable job, or one whose worker stopped renewing its lease"""
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            # Jobs that keep dying mid-run (e.g. killing the worker) stop being retried
+            cur.execute("""
+                UPDATE jobs
+                SET status = 'failed', message = 'Worker lease expired', locked_until = NULL,
+                    updated_at = NOW()
+                WHERE status = 'running' AND locked_until < NOW() AND attempts >= max_attempts
+            """)
+            cur.execute("""
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1, message = NULL,
+                    locked_until = NOW() + make_interval(secs => %s), updated_at = NOW()
+                WHERE job_id = (
+                    SELECT job_id FROM jobs
+                    WHERE (status = 'queued' AND run_after <= NOW())
+                       OR (status = 'running' AND locked_until < NOW())
+                    ORDER BY job_id
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING job_id, kind, payload, attempts, max_attempts
+            """, (JOB_LEASE_SECS,))
+            row = cur.fetchone()
+        conn.commit()
+    return row
+
+
+def _finish(job, result=None, error=None, retry=True):
+    # Only the run that still holds the job may settle it: after a lease
+    # expired and another worker reclaimed it, attempts has moved on
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            if error is None:
+                cur.execute("""
+                    UPDATE jobs
+                    SET status = 'succeeded', progress = 100, result = %s,
+                        locked_until = NULL, updated_at = NOW()
+                    WHERE job_id = %s AND status = 'running' AND attempts = %s
+                """, (Json(result), job.job_id, job.attempts))
+            elif retry and job.attempts < job.max_attempts:
+                # Retry with exponential backoff: 2s, 4s, 8s, ...
+                cur.execute("""
+                    UPDATE jobs
+                    SET status = 'queued', message = %s, locked_until = NULL,
+                        run_after = NOW() + make_interval(secs => %s), updated_at = NOW()
+                    WHERE job_id = %s AND status = 'running' AND attempts = %s
+                """, (error, 2 ** job.attempts, job.job_id, job.attempts))
+            else:
+                cur.execute("""
+                    UPDATE jobs
+                    SET status = 'failed', message = %s, locked_until = NULL, updated_at = NOW()
+                    WHERE job_id = %s AND status = 'running' AND attempts = %s
+                """, (error, job.job_id, job.attempts))
+            settled = cur.rowcount
+        conn.commit()
+    if not settled:
+        print(f"Job {job.job_id} ({job.kind}) attempt {job.attempts} lost its lease, outcome discarded")
+
+
+def _run_one():
+    row = _claim()
+    if not row:
+        return False
+
+    job = Job(row)
+    fn = HANDLERS.get(job.kind)
+    route_token = slowlog.bind_route(f"job {job.kind}")
+    try:
+        if fn is None:
+            raise ValueError(f"No handler for job kind {job.kind}")
+        job.payload = parse_payload(job.kind, job.payload)
+        result = fn(job)
+    except ValidationError as e:
+        # Retrying won't fix a payload queued before its model changed
+        print(f"Job {job.job_id} ({job.kind}) has an invalid payload: {str(e)}")
+        _finish(job, error=f"Invalid payload: {str(e)}", retry=False)
+    except Exception as e:
+        print(f"Job {job.job_id} ({job.kind}) attempt {job.attempts} failed: {str(e)}")
+        _finish(job, error=str(e))
+    else:
+        _finish(job, result=result)
+    finally:
+        slowlog.unbind_route(route_token)
+    return True
+
+
+def _work():
+    while not _stop.is_set():
+        try:
+            if _run_one():
+                continue
+        except Exception as e:
+            print(f"Job worker error: {str(e)}")
+        _wake.wait(JOB_POLL_SECS)
+        _wake.clear()
+
+
+def start_workers():
+    for i in range(JOB_WORKERS - len(_workers)):
+        worker = threading.Thread(target=_work, name=f"job-worker-{i}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+
+
+def stop_workers(timeout=JOB_STOP_SECS):
+    """Wait up to timeout for running jobs to finish; unfinished ones are reclaimed after the lease"""
+    _stop.set()
+    _wake.set()
+    deadline = time.monotonic() + timeout
+    for worker in _workers:
+        worker.join(max(0.0, deadline - time.monotonic()))
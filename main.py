@@ -1,8 +1,49 @@
-from fastapi import FastAPI
+import time
+_process_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from routers import exam_overview, sections, syllabus, notes, questions, analytics, auth
+import database
+import attempts
+import cache
+import dedup
+import jobs as job_queue
+import mastery
+import slowlog
+import warmup
+from profiler import ProfilerMiddleware, run_in_threadpool
+from ratelimit import RateLimitMiddleware
+from routers import exam_overview, sections, syllabus, notes, questions, analytics, auth, health, admin, media, practice, jobs, roster, exam_sessions
+
+warmup.mark_process_start(_process_started)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Listen for other workers' writes first so nothing between warm-up and LISTEN is missed
+    await run_in_threadpool(cache.start_listener)
+    # Open pools and fill caches before uvicorn starts accepting traffic
+    await run_in_threadpool(warmup.start)
+    mastery.buffer.start()
+    attempts.buffer.start()
+    attempts.start_sweeper()
+    dedup.start_backfill()
+    job_queue.start_workers()
+    yield
+    await run_in_threadpool(job_queue.stop_workers)
+    await run_in_threadpool(attempts.buffer.flush)
+    await run_in_threadpool(mastery.buffer.flush)
+    database.primary.close()
+    for replica in database.replicas:
+        replica.close()
+
+app = FastAPI(title="Olympiad App API", version="1.0.0", lifespan=lifespan)
 
-app = FastAPI(title="Olympiad App API", version="1.0.0")
+# Per-client rate limits and load shedding for heavy endpoints
+app.add_middleware(RateLimitMiddleware)
+
+# Opt-in sampling profiler: X-Profile plus an admin token, or PROFILE_SAMPLE_RATE
+app.add_middleware(ProfilerMiddleware, is_admin=admin.is_admin)
 
 # Configure CORS
 app.add_middleware(
@@ -16,8 +57,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods (GET, POST, PUT, DELETE, OPTIONS, etc.)
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Read-After"],
 )
 
+# Record time-to-first-response after a cold start
+@app.middleware("http")
+async def track_first_response(request: Request, call_next):
+    response = await call_next(request)
+    warmup.mark_first_response()
+    return response
+
+# Read-your-writes: a request that wrote answers with X-Read-After, the WAL
+# position after its commit; a client sending it back is only served by a
+# replica that has replayed that far. Also binds the route so slow queries
+# can be traced back to an endpoint
+@app.middleware("http")
+async def bind_db_request(request: Request, call_next):
+    token = database.bind_request(request.headers.get("x-read-after"))
+    route_token = slowlog.bind_route(f"{request.method} {request.url.path}")
+    try:
+        response = await call_next(request)
+        lsn = database.committed_lsn()
+        if lsn:
+            response.headers["X-Read-After"] = lsn
+        return response
+    finally:
+        slowlog.unbind_route(route_token)
+        database.unbind_request(token)
+
 # Include routers
 app.include_router(exam_overview.router)
 app.include_router(sections.router)
@@ -26,6 +93,15 @@ app.include_router(notes.router)
 app.include_router(questions.router)
 app.include_router(analytics.router)
 app.include_router(auth.router)
+app.include_router(health.router)
+app.include_router(admin.router)
+app.include_router(media.router)
+app.include_router(practice.router)
+app.include_router(jobs.router)
+app.include_router(roster.router)
+app.include_router(exam_sessions.router)
+
+warmup.mark_imported()
 
 @app.get("/")
 def root():
@@ -35,6 +111,7 @@ def root():
         "endpoints": {
             "exams": "/exams",
             "sections": "/exams/{exam_overview_id}/sections",
+            "health": "/health/ready",
             "docs": "/docs"
         }
     }
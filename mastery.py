@@ -0,0 +1,116 @@
+import os
+import threading
+from database import get_db
+import repository
+
+FLUSH_INTERVAL = float(os.getenv("MASTERY_FLUSH_SECS", "5"))
+FLUSH_THRESHOLD = int(os.getenv("MASTERY_FLUSH_ROWS", "5000"))  # pending rows that trigger an early flush
+MAX_PENDING = int(os.getenv("MASTERY_MAX_PENDING_ROWS", "200000"))  # cap while the database is down
+
+
+class StatsBuffer:
+    """Per-user topic stats aggregated in memory and flushed as batched upserts.
+
+    Answers add to user_id → (syllabus_id, difficulty) → [attempts, correct];
+    each flush writes one row per key however many answers it covers.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._rows = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def record(self, user_id, syllabus_id, difficulty, correct):
+        with self._lock:
+            self._add(user_id, (syllabus_id, difficulty), 1, int(correct))
+            size = self._rows
+        if size >= FLUSH_THRESHOLD:
+            self._wake.set()
+
+    def _add(self, user_id, key, attempts, correct):
+        topics = self._pending.setdefault(user_id, {})
+        if key not in topics:
+            self._rows += 1
+        counts = topics.setdefault(key, [0, 0])
+        counts[0] += attempts
+        counts[1] += correct
+
+    def pending_for(self, user_id):
+        """Unflushed {(syllabus_id, difficulty): (attempts, correct)} for one user"""
+        with self._lock:
+            return {key: tuple(counts) for key, counts in self._pending.get(user_id, {}).items()}
+
+    def _merge_back(self, batch):
+        with self._lock:
+            for user_id, topics in batch.items():
+                for key, (attempts, correct) in topics.items():
+                    if self._rows < MAX_PENDING or key in self._pending.get(user_id, {}):
+                        self._add(user_id, key, attempts, correct)
+
+    def flush(self):
+        """Write everything pending in one transaction; returns the number of rows"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending, self._rows = self._pending, {}, 0
+            if not batch:
+                return 0
+
+            # Sorted so concurrent flushes from several workers lock rows in the same order
+            rows = sorted(
+                (user_id, syllabus_id, difficulty, attempts, correct)
+                for user_id, topics in batch.items()
+                for (syllabus_id, difficulty), (attempts, correct) in topics.items()
+            )
+            try:
+                with get_db() as conn:
+                    with conn.cursor() as cur:
+                        repository.upsert_topic_stats(cur, rows)
+                    conn.commit()
+            except Exception as e:
+                print(f"Mastery flush failed, keeping {len(rows)} rows for retry: {str(e)}")
+                self._merge_back(batch)
+                return 0
+            return len(rows)
+
+    def _run(self):
+        while True:
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mastery-flush", daemon=True)
+            self._thread.start()
+
+
+buffer = StatsBuffer()
+
+
+def recommend(user_id, exam_overview_id, limit):
+    """Topics of an exam ordered weakest first, including answers not flushed yet"""
+    with get_db(readonly=True) as conn:
+        with conn.cursor() as cur:
+            topics = repository.get_topic_mastery(cur, user_id, exam_overview_id)
+
+    by_topic = {}
+    for (syllabus_id, difficulty), counts in buffer.pending_for(user_id).items():
+        by_topic.setdefault(syllabus_id, {})[difficulty] = counts
+
+    for topic in topics:
+        by_difficulty = topic["by_difficulty"]
+        for difficulty, (attempts, correct) in by_topic.get(topic["syllabus_id"], {}).items():
+            stats = by_difficulty.setdefault(difficulty, {"attempts": 0, "correct": 0})
+            stats["attempts"] += attempts
+            stats["correct"] += correct
+
+        topic["attempts"] = sum(s["attempts"] for s in by_difficulty.values())
+        topic["correct"] = sum(s["correct"] for s in by_difficulty.values())
+        topic["accuracy"] = round(topic["correct"] / topic["attempts"], 3) if topic["attempts"] else None
+
+    # Laplace-smoothed accuracy: untried topics rank as 50%, a single miss doesn't dominate
+    topics.sort(key=lambda t: ((t["correct"] + 1) / (t["attempts"] + 2), t["attempts"]))
+    return topics[:limit]
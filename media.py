@@ -0,0 +1,157 @@
+import hashlib
+import os
+import re
+import tempfile
+from fastapi import HTTPException, Request
+from profiler import run_in_threadpool
+from PIL import Image, UnidentifiedImageError
+
+MEDIA_ROOT = os.path.abspath(os.getenv("MEDIA_ROOT", "media"))
+MAX_UPLOAD_BYTES = int(os.getenv("MEDIA_MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))
+MAX_PIXELS = int(os.getenv("MEDIA_MAX_PIXELS", str(40_000_000)))  # rejects decompression bombs
+WRITE_BUFFER_BYTES = 256 * 1024  # upload bytes gathered per write in the threadpool
+# Internal location of MEDIA_ROOT on the front proxy, e.g. /protected-media/; when set,
+# GET /media/{name} answers with X-Accel-Redirect and the proxy sends the file itself
+ACCEL_REDIRECT = os.getenv("MEDIA_ACCEL_REDIRECT", "")
+
+# Content types we accept, with the extension stored on disk and Pillow's format name
+IMAGE_TYPES = {
+    "image/png": ("png", "PNG"),
+    "image/jpeg": ("jpg", "JPEG"),
+    "image/gif": ("gif", "GIF"),
+    "image/webp": ("webp", "WEBP"),
+}
+MEDIA_TYPES = {ext: content_type for content_type, (ext, _) in IMAGE_TYPES.items()}
+
+# Longest-side limits of the downscaled variants generated per upload kind
+PROFILE_VARIANTS = (64, 256)
+FIGURE_VARIANTS = (480, 1024)
+
+# <sha256>.<ext> for originals, <sha256>.<size>.<ext> for variants
+MEDIA_NAME = re.compile(r"^(?P<sha256>[0-9a-f]{64})(\.(?P<size>\d+))?\.(?P<ext>png|jpg|gif|webp)$")
+
+CACHE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+
+
+def path_for(name):
+    """On-disk path of a stored file, sharded by the first two bytes of its hash"""
+    return os.path.join(MEDIA_ROOT, name[:2], name[2:4], name)
+
+
+def url_for(name):
+    return f"/media/{name}"
+
+
+def accel_path_for(name):
+    """Location of a stored file under the proxy's internal MEDIA_ACCEL_REDIRECT prefix"""
+    return f"{ACCEL_REDIRECT.rstrip('/')}/{name[:2]}/{name[2:4]}/{name}"
+
+
+def etag_for(name):
+    return f'"{name}"'
+
+
+def etag_matches(if_none_match, name):
+    """Whether an If-None-Match header value covers the file's ETag"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag_for(name) for tag in tags)
+
+
+def _finalize(tmp_path, sha256, ext, pil_format, sizes):
+    """Validate the image, move it into the store and write its variants"""
+    try:
+        try:
+            with Image.open(tmp_path) as image:
+                if image.format != pil_format:
+                    raise HTTPException(status_code=415, detail="File content does not match Content-Type")
+                image.verify()
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+            raise HTTPException(status_code=415, detail="Not a valid image")
+
+        name = f"{sha256}.{ext}"
+        target = path_for(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(target):
+            os.remove(tmp_path)  # already stored, deduplicated by hash
+        else:
+            os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    variants = {}
+    with Image.open(target) as image:
+        for size in sizes:
+            if max(image.size) <= size:
+                variants[str(size)] = url_for(name)
+                continue
+            variant_name = f"{sha256}.{size}.{ext}"
+            variant_path = path_for(variant_name)
+            if not os.path.exists(variant_path):
+                variant = image.copy()
+                variant.thumbnail((size, size))
+                # Write then rename so readers never see a partial file
+                tmp_variant = f"{variant_path}.{os.getpid()}.tmp"
+                variant.save(tmp_variant, format=pil_format)
+                os.replace(tmp_variant, variant_path)
+            variants[str(size)] = url_for(variant_name)
+
+    return {"sha256": sha256, "url": url_for(name), "variants": variants}
+
+
+def _open_tmp():
+    tmp_dir = os.path.join(MEDIA_ROOT, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False)
+
+
+def _write(tmp, digest, chunks):
+    data = b"".join(chunks)
+    digest.update(data)
+    tmp.write(data)
+
+
+async def store_upload(request: Request, sizes):
+    """Stream a raw image request body into the store without buffering it in memory.
+
+    Disk writes and hashing run in the threadpool, a few hundred KB at a time,
+    so a slow disk never stalls the event loop.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in IMAGE_TYPES:
+        raise HTTPException(status_code=415, detail=f"Unsupported image type, use one of: {', '.join(IMAGE_TYPES)}")
+    ext, pil_format = IMAGE_TYPES[content_type]
+
+    digest = hashlib.sha256()
+    size = 0
+    chunks, buffered = [], 0
+
+    tmp = await run_in_threadpool(_open_tmp)
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+            chunks.append(chunk)
+            buffered += len(chunk)
+            if buffered >= WRITE_BUFFER_BYTES:
+                await run_in_threadpool(_write, tmp, digest, chunks)
+                chunks, buffered = [], 0
+        await run_in_threadpool(_write, tmp, digest, chunks)
+        await run_in_threadpool(tmp.close)
+    except BaseException:
+        # Not awaited: a cancelled request can't run anything else on the loop
+        tmp.close()
+        os.remove(tmp.name)
+        raise
+
+    if size == 0:
+        await run_in_threadpool(os.remove, tmp.name)
+        raise HTTPException(status_code=400, detail="Empty upload")
+
+    return await run_in_threadpool(_finalize, tmp.name, digest.hexdigest(), ext, pil_format, sizes)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime, date
 
 # Exam Overview Models
@@ -96,13 +96,99 @@ class QuestionResponse(BaseModel):
     option_d: str
     correct_option: str
     solution: str
+    figure: Optional[str] = None
     is_active: bool
     created_at: datetime
     updated_at: datetime
 
-# # Bulk Upload Model
-# class BulkUploadRequest(BaseModel):
-#     questions: List[QuestionCreate]
+class ArchivedQuestionResponse(QuestionResponse):
+    archived_at: datetime
+
+# Practice Models
+class PracticeAnswer(BaseModel):
+    question_id: int
+    selected_option: str = Field(..., max_length=5)
+
+class PracticeSubmission(BaseModel):
+    answers: List[PracticeAnswer] = Field(..., min_length=1, max_length=500)
+
+class PracticeResult(BaseModel):
+    question_id: int
+    correct: bool
+    correct_option: str
+
+class PracticeSubmissionResponse(BaseModel):
+    recorded: int
+    correct: int
+    results: List[PracticeResult]
+
+class TopicMastery(BaseModel):
+    syllabus_id: int
+    section_id: int
+    section: str
+    topic: str
+    subtopic: Optional[str] = None
+    attempts: int
+    correct: int
+    accuracy: Optional[float] = None
+    by_difficulty: Dict[str, Dict[str, int]]
+
+# Job Models
+class DeleteExamPayload(BaseModel):
+    exam_overview_id: int
+
+class ArchiveQuestionsPayload(BaseModel):
+    exam_overview_id: Optional[int] = None
+    older_than_days: int = Field(0, ge=0)
+
+class JobCreate(BaseModel):
+    kind: str = Field(..., max_length=50)
+    payload: Dict[str, Any] = {}
+
+class JobResponse(BaseModel):
+    job_id: int
+    kind: str
+    payload: Dict[str, Any]
+    status: str
+    progress: int
+    message: Optional[str] = None
+    attempts: int
+    max_attempts: int
+    result: Optional[Any] = None
+    created_at: datetime
+    updated_at: datetime
+
+# Media Models
+class MediaResponse(BaseModel):
+    sha256: str
+    url: str
+    variants: Dict[str, str]
+
+# Bulk Upload Models
+class BulkUploadRequest(BaseModel):
+    questions: List[QuestionCreate] = Field(..., min_length=1, max_length=1000)
+
+class NearDuplicate(BaseModel):
+    question_id: int
+    syllabus_id: int
+    similarity: float
+
+class BulkDuplicate(BaseModel):
+    index: int
+    inserted: bool
+    matches: List[NearDuplicate]
+
+class BulkUploadResponse(BaseModel):
+    created: List[QuestionResponse]
+    duplicates: List[BulkDuplicate]
+
+class DuplicateClusterMember(BaseModel):
+    question_id: int
+    syllabus_id: int
+
+class DuplicateCluster(BaseModel):
+    questions: List[DuplicateClusterMember]
+    min_similarity: float
 
 # # AI Generate Model
 # class AIGenerateRequest(BaseModel):
@@ -148,4 +234,20 @@ class UserResponse(BaseModel):
     last_login: Optional[datetime]  # Changed from str to datetime
     is_active: bool
     created_at: datetime  # Changed from str to datetime
-    updated_at: datetime  # Changed from str to datetime
\ No newline at end of file
+    updated_at: datetime  # Changed from str to datetime
+
+# Roster Import Models
+class RosterRow(BaseModel):
+    row: int
+    email: Optional[str] = None
+    status: str  # created, existing, duplicate or invalid
+    user_id: Optional[int] = None
+    message: Optional[str] = None
+
+class RosterImportResponse(BaseModel):
+    total: int
+    created: int
+    existing: int
+    duplicate: int
+    invalid: int
+    rows: List[RosterRow]
\ No newline at end of file
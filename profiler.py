@@ -0,0 +1,256 @@
+import asyncio
+import collections
+import contextvars
+import functools
+import os
+import random
+import re
+import sys
+import threading
+import time
+from fastapi.routing import APIRoute
+from starlette import concurrency
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))    # share of requests profiled without the header
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000  # time between stack samples
+PROFILE_DIR = os.path.abspath(os.getenv("PROFILE_DIR", "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))          # oldest profiles deleted beyond this
+PROFILE_MAX_ACTIVE = int(os.getenv("PROFILE_MAX_ACTIVE", "4"))          # requests profiled at once
+
+# <unix millis>-<method>-<path slug>.folded
+PROFILE_NAME = re.compile(r"^\d+-[A-Z]+-[\w.-]+\.folded$")
+
+# (file, function) of the innermost frame of an event loop with nothing to do
+_IDLE_LOOP = {("selectors.py", "select"), ("base_events.py", "run_forever"), ("runners.py", "run")}
+
+# Sampler of the request being profiled, seen by the threadpool calls it makes
+_active = contextvars.ContextVar("profile", default=None)
+_slots = threading.BoundedSemaphore(PROFILE_MAX_ACTIVE)
+
+
+def _is_idle(frame):
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_LOOP
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """Samples one request's threads on a background thread until stopped.
+
+    Those are the event loop thread, only while it runs one of the request's
+    own tasks, and whichever threadpool thread is running the request's sync
+    code at the moment; both are registered by tracked(). Other requests'
+    coroutines and threadpool work are never counted.
+
+    Stacks are counted in folded form ("thread;outer;...;inner"), the input
+    format of flamegraph.pl, speedscope and most flamegraph viewers.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._tasks = {asyncio.current_task()}
+        self._threads = {}
+        self._threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def watch(self, ident):
+        with self._threads_lock:
+            self._threads[ident] = "worker"
+
+    def unwatch(self, ident):
+        with self._threads_lock:
+            self._threads.pop(ident, None)
+
+    def watch_task(self, task):
+        with self._threads_lock:
+            self._tasks.add(task)
+
+    def unwatch_task(self, task):
+        with self._threads_lock:
+            self._tasks.discard(task)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.elapsed = time.perf_counter() - self._started
+
+    def join(self):
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._threads_lock:
+                threads = dict(self._threads)
+                # The loop thread counts only while it runs this request's code
+                if asyncio.current_task(self._loop) in self._tasks:
+                    threads[self._loop_thread] = "loop"
+            for ident, name in threads.items():
+                frame = frames.get(ident)
+                if frame is None or _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(name)
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+def tracked(fn):
+    """fn, sampled with the request it runs for: a sync fn on the thread running it,
+    a coroutine function while its task runs on the event loop"""
+    if getattr(fn, "__profiled__", False):
+        return fn
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def run_async(*args, **kwargs):
+            sampler = _active.get()
+            if sampler is None:
+                return await fn(*args, **kwargs)
+            task = asyncio.current_task()
+            sampler.watch_task(task)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                sampler.unwatch_task(task)
+        run_async.__profiled__ = True
+        return run_async
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        sampler = _active.get()
+        if sampler is None:
+            return fn(*args, **kwargs)
+        ident = threading.get_ident()
+        sampler.watch(ident)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            sampler.unwatch(ident)
+    run.__profiled__ = True
+    return run
+
+
+async def run_in_threadpool(fn, *args, **kwargs):
+    """Starlette's run_in_threadpool, with the thread sampled when the request is profiled.
+
+    Use this rather than Starlette's or FastAPI's own everywhere in the app.
+    """
+    return await concurrency.run_in_threadpool(tracked(fn), *args, **kwargs)
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose endpoint runs through tracked(); the route_class of every router"""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, tracked(endpoint), **kwargs)
+
+
+def wanted(forced):
+    return forced or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+
+
+def profile_name(method, path):
+    slug = re.sub(r"[^\w.-]+", "_", path.strip("/")) or "root"
+    return f"{int(time.time() * 1000)}-{method}-{slug[:80]}.folded"
+
+
+def save(name, sampler, status_code):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, name)
+    with open(f"{path}.tmp", "w") as f:
+        f.write(f"# status={status_code} elapsed_ms={sampler.elapsed * 1000:.1f} "
+                f"samples={sampler.samples} interval_ms={sampler.interval * 1000:g}\n")
+        for stack, count in sampler.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    os.replace(f"{path}.tmp", path)
+
+    for old in list_profiles()[PROFILE_MAX_FILES:]:
+        os.remove(os.path.join(PROFILE_DIR, old["name"]))
+
+
+def list_profiles():
+    """Stored profiles, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if PROFILE_NAME.match(name):
+            stat = os.stat(os.path.join(PROFILE_DIR, name))
+            profiles.append({"name": name, "bytes": stat.st_size, "created_at": stat.st_mtime})
+    profiles.sort(key=lambda p: p["name"], reverse=True)
+    return profiles
+
+
+def path_for(name):
+    """Path of a stored profile, or None for names that aren't one"""
+    if not PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+class ProfilerMiddleware:
+    """Profile requests sent with X-Profile and a valid X-Admin-Token, or a
+    PROFILE_SAMPLE_RATE share of all requests.
+
+    Unprofiled requests only pay for a header lookup. The profile's name is
+    returned in the X-Profile header and it can be fetched from /admin/profiles.
+    """
+
+    def __init__(self, app, is_admin):
+        self.app = app
+        self.is_admin = is_admin
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        forced = b"x-profile" in headers and self.is_admin(headers.get(b"x-admin-token", b"").decode("latin-1"))
+        if not wanted(forced) or not _slots.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        name = profile_name(scope["method"], scope["path"])
+        status = {}
+
+        async def send_with_name(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile", name.encode())]
+            await send(message)
+
+        sampler = Sampler()
+        token = _active.set(sampler)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_name)
+        finally:
+            sampler.stop()
+            _active.reset(token)
+            await concurrency.run_in_threadpool(_finish, name, sampler, status.get("code"))
+
+
+def _finish(name, sampler, status_code):
+    try:
+        sampler.join()
+        save(name, sampler, status_code)
+    except OSError as e:
+        print(f"Could not save profile {name}: {str(e)}")
+    finally:
+        _slots.release()
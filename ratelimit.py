@@ -0,0 +1,133 @@
+import asyncio
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from starlette.responses import JSONResponse
+from singleflight import reads
+
+RATE_PER_SEC = float(os.getenv("RATE_LIMIT_PER_SEC", "10"))        # tokens refilled per client per second
+BURST = float(os.getenv("RATE_LIMIT_BURST", "40"))                 # bucket capacity per client
+IP_RATE_PER_SEC = float(os.getenv("RATE_LIMIT_IP_PER_SEC", "300"))  # ceiling shared by every client behind one IP
+IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", "1200"))
+MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))    # buckets kept in memory
+HEAVY_CONCURRENCY = int(os.getenv("HEAVY_CONCURRENCY", "8"))       # heavy requests running at once
+HEAVY_QUEUE = int(os.getenv("HEAVY_QUEUE", "64"))                  # heavy requests allowed to wait
+HEAVY_QUEUE_TIMEOUT = float(os.getenv("HEAVY_QUEUE_TIMEOUT", "5"))  # seconds a heavy request may wait
+MAX_CLIENT_ID_CHARS = 64
+
+# (method, path pattern, token cost, heavy, single-flight key or None); first match wins,
+# anything else costs 1. A request that would join an identical read already in
+# flight costs 1 too, and single-flight routes are not heavy: they add no database work.
+ROUTE_COSTS = [
+    ("GET", re.compile(r"^/exams/(\d+)/overview$"), 4, False, lambda m: ("overview", int(m.group(1)))),
+    ("GET", re.compile(r"^/questions$"), 5, True, None),
+    ("GET", re.compile(r"^/analytics/exam/\d+$"), 3, False, None),
+    ("POST", re.compile(r"^/users/roster$"), 20, True, None),
+]
+
+
+class TokenBucket:
+    """Per-client token buckets, least recently seen clients evicted first"""
+
+    def __init__(self, rate, burst, max_clients):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client_id, cost):
+        """Spend cost tokens; returns 0 on success or seconds until enough have refilled"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(client_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (min(cost, self.burst) - tokens) / self.rate
+            self._buckets[client_id] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+def _route_cost(method, path):
+    for route_method, pattern, cost, heavy, flight in ROUTE_COSTS:
+        match = pattern.match(path) if method == route_method else None
+        if match:
+            if flight and reads.in_flight(flight(match)):
+                return 1, False
+            return cost, heavy
+    return 1, False
+
+
+def _identities(scope):
+    """(client key, IP); the client is its X-Client-Id when sent, else its IP"""
+    ip = scope["client"][0] if scope.get("client") else "unknown"
+    for name, value in scope["headers"]:
+        if name == b"x-client-id" and value:
+            # Scoped to the IP so a client can't spend another network's budget
+            return f"{ip}|{value[:MAX_CLIENT_ID_CHARS].decode('latin-1')}", ip
+    return ip, ip
+
+
+def _reject(status_code, detail, retry_after):
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class RateLimitMiddleware:
+    """Token-bucket rate limit per client, under a higher ceiling per IP, plus a
+    queued concurrency cap for heavy routes.
+
+    Clients behind one NAT (a school on exam day) each get their own bucket when
+    they send X-Client-Id; the IP ceiling still bounds what rotating ids can take.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.buckets = TokenBucket(RATE_PER_SEC, BURST, MAX_CLIENTS)
+        self.ip_buckets = TokenBucket(IP_RATE_PER_SEC, IP_BURST, MAX_CLIENTS)
+        self.heavy_slots = asyncio.Semaphore(HEAVY_CONCURRENCY)
+        self.heavy_waiting = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        cost, heavy = _route_cost(scope["method"], scope["path"])
+        client_id, ip = _identities(scope)
+
+        # The client's own bucket first, so one noisy client can't drain its neighbours' ceiling
+        wait = self.buckets.take(client_id, cost)
+        if not wait and client_id != ip:
+            wait = self.ip_buckets.take(ip, cost)
+        if wait:
+            return await _reject(429, "Too many requests", wait)(scope, receive, send)
+
+        if not heavy:
+            return await self.app(scope, receive, send)
+
+        if self.heavy_slots.locked() and self.heavy_waiting >= HEAVY_QUEUE:
+            return await _reject(503, "Server busy, try again shortly", HEAVY_QUEUE_TIMEOUT)(scope, receive, send)
+
+        self.heavy_waiting += 1
+        try:
+            await asyncio.wait_for(self.heavy_slots.acquire(), HEAVY_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return await _reject(503, "Server busy, try again shortly", HEAVY_QUEUE_TIMEOUT)(scope, receive, send)
+        finally:
+            self.heavy_waiting -= 1
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.heavy_slots.release()
@@ -0,0 +1,850 @@
+from fastapi import HTTPException
+import psycopg2.errorcodes
+from psycopg2.extras import execute_values
+import statements
+
+# Column lists shared by every handler that reads or returns these rows
+EXAM_COLUMNS = ["exam_overview_id", "exam", "grade", "level",
+                "total_questions", "total_marks", "total_time_mins"]
+SECTION_COLUMNS = ["section_id", "exam_overview_id", "section",
+                   "no_of_questions", "marks_per_question", "total_marks"]
+SYLLABUS_COLUMNS = ["syllabus_id", "exam_overview_id", "section_id", "topic", "subtopic"]
+NOTE_COLUMNS = ["note_id", "note", "exam_overview_id"]
+QUESTION_COLUMNS = ["question_id", "syllabus_id", "difficulty", "question_text",
+                    "option_a", "option_b", "option_c", "option_d", "correct_option",
+                    "solution", "figure", "is_active", "created_at", "updated_at"]
+USER_COLUMNS = ["user_id", "first_name", "last_name", "email", "grade", "date_of_birth",
+                "country_code", "phone_number", "profile_image", "school_name",
+                "city", "state", "email_verified", "phone_verified", "last_login",
+                "is_active", "created_at", "updated_at"]
+
+
+def columns(names, alias=None):
+    return ", ".join(f"{alias}.{name}" if alias else name for name in names)
+
+
+# Status and message for each named constraint in the schema
+CONSTRAINT_ERRORS = {
+    "exam_overview_uk": (400, "Exam already exists with this combination"),
+    "sections_exam_fk": (404, "Exam not found"),
+    "sections_uk": (400, "Section already exists"),
+    "sections_total_marks_ck": (400, "total_marks must equal no_of_questions × marks_per_question"),
+    "syllabus_exam_fk": (404, "Exam not found"),
+    "syllabus_section_fk": (404, "Section not found"),
+    "syllabus_uk": (400, "Topic/Subtopic already exists"),
+    "questions_syllabus_fk": (404, "Syllabus topic not found"),
+    "notes_exam_fk": (404, "Exam not found"),
+    "users_email_key": (400, "Email already registered"),
+    "exam_attempts_user_fk": (404, "User not found"),
+    "exam_attempts_exam_fk": (404, "Exam not found"),
+}
+
+
+def integrity_error(e):
+    """Translate a psycopg2.IntegrityError into the HTTPException for its constraint"""
+    constraint = e.diag.constraint_name
+    print(f"Database Error: {constraint}: {e.diag.message_primary}")
+    if constraint in CONSTRAINT_ERRORS:
+        status_code, detail = CONSTRAINT_ERRORS[constraint]
+    elif e.pgcode == psycopg2.errorcodes.FOREIGN_KEY_VIOLATION:
+        status_code, detail = 404, "Referenced record not found"
+    elif e.pgcode == psycopg2.errorcodes.CHECK_VIOLATION:
+        status_code, detail = 400, f"Validation failed: {e.diag.message_primary}"
+    else:
+        status_code, detail = 400, f"Database constraint violation: {e.diag.message_primary}"
+    return HTTPException(status_code=status_code, detail=detail)
+
+
+def _existing_children(rows, child_key):
+    """Rows of a parent LEFT JOIN child: None if no parent row, else the non-NULL children"""
+    if not rows:
+        return None
+    return [row for row in rows if row[child_key] is not None]
+
+
+def _children(cur, parent_table, parent_key, child_table, child_columns, child_key, parent_id):
+    """Children of one parent row in a single statement.
+
+    Returns None when the parent does not exist and [] when it has no children.
+    """
+    cur.execute(f"""
+        SELECT {columns(child_columns, "c")}
+        FROM {parent_table} p
+        LEFT JOIN {child_table} c ON c.{parent_key} = p.{parent_key}
+        WHERE p.{parent_key} = %s
+        ORDER BY c.{child_key}
+    """, (parent_id,))
+    return _existing_children(cur.fetchall(), child_key)
+
+
+def _update(cur, table, key, key_value, fields, returning, touch=False):
+    """UPDATE the given non-empty fields; returns the updated row or None"""
+    assignments = [f"{name} = %s" for name in fields]
+    if touch:
+        assignments.append("updated_at = NOW()")
+    cur.execute(f"""
+        UPDATE {table}
+        SET {', '.join(assignments)}
+        WHERE {key} = %s
+        RETURNING {columns(returning)}
+    """, [*fields.values(), key_value])
+    return cur.fetchone()
+
+
+def _delete(cur, table, key, key_value, returning=None):
+    """DELETE one row; returns whether it existed, or with returning the deleted row or None"""
+    if returning is None:
+        cur.execute(f"DELETE FROM {table} WHERE {key} = %s", (key_value,))
+        return cur.rowcount > 0
+    cur.execute(f"DELETE FROM {table} WHERE {key} = %s RETURNING {columns(returning)}", (key_value,))
+    return cur.fetchone()
+
+
+# Exams
+statements.register("exam_by_id", "integer", f"""
+    SELECT {columns(EXAM_COLUMNS)}
+    FROM exam_overview
+    WHERE exam_overview_id = $1
+""")
+
+
+def list_exams(cur):
+    cur.execute(f"SELECT {columns(EXAM_COLUMNS)} FROM exam_overview ORDER BY exam_overview_id")
+    return cur.fetchall()
+
+
+def get_exam(cur, exam_overview_id):
+    statements.execute(cur, "exam_by_id", (exam_overview_id,))
+    return cur.fetchone()
+
+
+def create_exam(cur, exam):
+    cur.execute(f"""
+        INSERT INTO exam_overview
+        (exam, grade, level, total_questions, total_marks, total_time_mins)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING {columns(EXAM_COLUMNS)}
+    """, (exam.exam, exam.grade, exam.level, exam.total_questions,
+          exam.total_marks, exam.total_time_mins))
+    return cur.fetchone()
+
+
+def update_exam(cur, exam_overview_id, fields):
+    return _update(cur, "exam_overview", "exam_overview_id", exam_overview_id, fields, EXAM_COLUMNS)
+
+
+def delete_exam(cur, exam_overview_id):
+    return _delete(cur, "exam_overview", "exam_overview_id", exam_overview_id)
+
+
+def exam_exists(cur, exam_overview_id):
+    cur.execute("SELECT 1 FROM exam_overview WHERE exam_overview_id = %s", (exam_overview_id,))
+    return cur.fetchone() is not None
+
+
+def count_exam_questions(cur, exam_overview_id):
+    cur.execute("""
+        SELECT (SELECT COUNT(*) FROM questions q
+                JOIN syllabus s ON s.syllabus_id = q.syllabus_id
+                WHERE s.exam_overview_id = %(id)s)
+             + (SELECT COUNT(*) FROM questions_archive q
+                JOIN syllabus s ON s.syllabus_id = q.syllabus_id
+                WHERE s.exam_overview_id = %(id)s) AS count
+    """, {"id": exam_overview_id})
+    return cur.fetchone()["count"]
+
+
+def delete_exam_questions(cur, exam_overview_id, batch_size=5000):
+    """Delete one batch of an exam's questions, live or archived; returns the count deleted"""
+    deleted = 0
+    for table in ("questions", "questions_archive"):
+        cur.execute(f"""
+            DELETE FROM {table}
+            WHERE question_id IN (
+                SELECT q.question_id FROM {table} q
+                JOIN syllabus s ON s.syllabus_id = q.syllabus_id
+                WHERE s.exam_overview_id = %s
+                LIMIT %s
+            )
+        """, (exam_overview_id, batch_size - deleted))
+        deleted += cur.rowcount
+        if deleted >= batch_size:
+            break
+    return deleted
+
+
+# Sections
+statements.register("sections_by_exam", "integer", f"""
+    SELECT {columns(SECTION_COLUMNS, "s")}
+    FROM exam_overview e
+    LEFT JOIN sections s ON s.exam_overview_id = e.exam_overview_id
+    WHERE e.exam_overview_id = $1
+    ORDER BY s.section_id
+""")
+
+
+def list_sections(cur, exam_overview_id):
+    """Sections of an exam, or None if the exam does not exist"""
+    statements.execute(cur, "sections_by_exam", (exam_overview_id,))
+    return _existing_children(cur.fetchall(), "section_id")
+
+
+def create_section(cur, exam_overview_id, section):
+    cur.execute(f"""
+        INSERT INTO sections
+        (exam_overview_id, section, no_of_questions, marks_per_question, total_marks)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING {columns(SECTION_COLUMNS)}
+    """, (exam_overview_id, section.section, section.no_of_questions,
+          section.marks_per_question, section.total_marks))
+    return cur.fetchone()
+
+
+def update_section(cur, section_id, fields):
+    return _update(cur, "sections", "section_id", section_id, fields, SECTION_COLUMNS)
+
+
+def delete_section(cur, section_id):
+    return _delete(cur, "sections", "section_id", section_id, ["exam_overview_id"])
+
+
+# Syllabus
+def list_syllabus(cur, section_id):
+    """Syllabus entries of a section, or None if the section does not exist"""
+    return _children(cur, "sections", "section_id", "syllabus", SYLLABUS_COLUMNS,
+                     "syllabus_id", section_id)
+
+
+def create_syllabus(cur, section_id, syllabus):
+    """Insert a topic under a section, or return None if the section does not exist"""
+    cur.execute(f"""
+        INSERT INTO syllabus (exam_overview_id, section_id, topic, subtopic)
+        SELECT exam_overview_id, section_id, %s, %s
+        FROM sections
+        WHERE section_id = %s
+        RETURNING {columns(SYLLABUS_COLUMNS)}
+    """, (syllabus.topic, syllabus.subtopic, section_id))
+    return cur.fetchone()
+
+
+def update_syllabus(cur, syllabus_id, fields):
+    return _update(cur, "syllabus", "syllabus_id", syllabus_id, fields, SYLLABUS_COLUMNS)
+
+
+def delete_syllabus(cur, syllabus_id):
+    return _delete(cur, "syllabus", "syllabus_id", syllabus_id, ["exam_overview_id"])
+
+
+# Notes
+def list_notes(cur, exam_overview_id):
+    """Notes of an exam, or None if the exam does not exist"""
+    return _children(cur, "exam_overview", "exam_overview_id", "notes", NOTE_COLUMNS,
+                     "note_id", exam_overview_id)
+
+
+def create_note(cur, exam_overview_id, note):
+    cur.execute(f"""
+        INSERT INTO notes (note, exam_overview_id)
+        VALUES (%s, %s)
+        RETURNING {columns(NOTE_COLUMNS)}
+    """, (note.note, exam_overview_id))
+    return cur.fetchone()
+
+
+def update_note(cur, note_id, fields):
+    return _update(cur, "notes", "note_id", note_id, fields, NOTE_COLUMNS)
+
+
+def delete_note(cur, note_id):
+    return _delete(cur, "notes", "note_id", note_id, ["exam_overview_id"])
+
+
+# Questions
+def list_questions(cur, syllabus_id=None, difficulty=None):
+    query = f"SELECT {columns(QUESTION_COLUMNS)} FROM questions WHERE is_active = TRUE"
+    params = []
+
+    if syllabus_id:
+        query += " AND syllabus_id = %s"
+        params.append(syllabus_id)
+
+    if difficulty:
+        query += " AND difficulty = %s"
+        params.append(difficulty)
+
+    query += " ORDER BY question_id"
+
+    cur.execute(query, params)
+    return cur.fetchall()
+
+
+def list_topic_questions(cur, syllabus_id):
+    """Active questions of a topic, or None if the topic does not exist"""
+    cur.execute(f"""
+        SELECT {columns(QUESTION_COLUMNS, "q")}
+        FROM syllabus s
+        LEFT JOIN questions q ON q.syllabus_id = s.syllabus_id AND q.is_active = TRUE
+        WHERE s.syllabus_id = %s
+        ORDER BY q.question_id
+    """, (syllabus_id,))
+    return _existing_children(cur.fetchall(), "question_id")
+
+
+def create_question(cur, syllabus_id, question, signature=None):
+    """Insert a question, with its near-duplicate signature when known"""
+    cur.execute(f"""
+        INSERT INTO questions
+        (syllabus_id, difficulty, question_text, option_a, option_b,
+         option_c, option_d, correct_option, solution, text_signature)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING {columns(QUESTION_COLUMNS)}
+    """, (syllabus_id, question.difficulty, question.question_text,
+          question.option_a, question.option_b, question.option_c,
+          question.option_d, question.correct_option, question.solution, signature))
+    return cur.fetchone()
+
+
+def create_questions(cur, syllabus_id, questions, signatures):
+    """Insert many questions under one topic in a single statement, in input order"""
+    rows = [
+        (position, syllabus_id, q.difficulty, q.question_text, q.option_a, q.option_b,
+         q.option_c, q.option_d, q.correct_option, q.solution, signature)
+        for position, (q, signature) in enumerate(zip(questions, signatures))
+    ]
+    # Ids are assigned in position order, so sorting by question_id restores input order
+    inserted = execute_values(cur, f"""
+        WITH v (position, syllabus_id, difficulty, question_text, option_a, option_b,
+                option_c, option_d, correct_option, solution, text_signature) AS (VALUES %s),
+        inserted AS (
+            INSERT INTO questions
+            (syllabus_id, difficulty, question_text, option_a, option_b,
+             option_c, option_d, correct_option, solution, text_signature)
+            SELECT syllabus_id, difficulty, question_text, option_a, option_b,
+                   option_c, option_d, correct_option, solution, text_signature
+            FROM v ORDER BY position
+            RETURNING {columns(QUESTION_COLUMNS)}
+        )
+        SELECT * FROM inserted ORDER BY question_id
+    """, rows, template="(%s, %s::integer, %s, %s, %s, %s, %s, %s, %s, %s, %s::bytea)",
+        page_size=max(len(rows), 1), fetch=True)
+    return inserted
+
+
+def update_question(cur, question_id, fields):
+    return _update(cur, "questions", "question_id", question_id, fields, QUESTION_COLUMNS, touch=True)
+
+
+def delete_question(cur, question_id):
+    return _delete(cur, "questions", "question_id", question_id, ["syllabus_id"])
+
+
+def question_exists(cur, question_id):
+    cur.execute("SELECT 1 FROM questions WHERE question_id = %s", (question_id,))
+    return cur.fetchone() is not None
+
+
+def set_question_figure(cur, question_id, url):
+    return _update(cur, "questions", "question_id", question_id, {"figure": url}, ["question_id", "syllabus_id"],
+                   touch=True)
+
+
+# Archive: inactive questions live in questions_archive so the hot table stays small
+ARCHIVED_QUESTION_COLUMNS = QUESTION_COLUMNS + ["archived_at"]
+
+
+def archive_questions(cur, exam_overview_id=None, older_than_days=0, batch_size=1000):
+    """Move one batch of inactive questions into questions_archive; returns the count moved"""
+    query = """
+        SELECT q.question_id
+        FROM questions q
+        JOIN syllabus s ON s.syllabus_id = q.syllabus_id
+        WHERE q.is_active = FALSE
+          AND q.updated_at <= NOW() - make_interval(days => %s)
+    """
+    params = [older_than_days]
+
+    if exam_overview_id:
+        query += " AND s.exam_overview_id = %s"
+        params.append(exam_overview_id)
+
+    query += " LIMIT %s FOR UPDATE OF q SKIP LOCKED"
+    params.append(batch_size)
+
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM questions
+            WHERE question_id IN ({query})
+            RETURNING {columns(QUESTION_COLUMNS)}
+        )
+        INSERT INTO questions_archive ({columns(QUESTION_COLUMNS)})
+        SELECT {columns(QUESTION_COLUMNS)} FROM moved
+    """, params)
+    return cur.rowcount
+
+
+def list_archived_questions(cur, syllabus_id=None, limit=100):
+    query = f"SELECT {columns(ARCHIVED_QUESTION_COLUMNS)} FROM questions_archive"
+    params = []
+
+    if syllabus_id:
+        query += " WHERE syllabus_id = %s"
+        params.append(syllabus_id)
+
+    query += " ORDER BY question_id LIMIT %s"
+    params.append(limit)
+
+    cur.execute(query, params)
+    return cur.fetchall()
+
+
+def restore_question(cur, question_id):
+    """Move an archived question back into questions as active, or return None"""
+    restored = [
+        "TRUE" if name == "is_active" else "NOW()" if name == "updated_at" else name
+        for name in QUESTION_COLUMNS
+    ]
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM questions_archive
+            WHERE question_id = %s
+            RETURNING {columns(QUESTION_COLUMNS)}
+        )
+        INSERT INTO questions ({columns(QUESTION_COLUMNS)})
+        OVERRIDING SYSTEM VALUE
+        SELECT {', '.join(restored)} FROM moved
+        RETURNING {columns(QUESTION_COLUMNS)}
+    """, (question_id,))
+    return cur.fetchone()
+
+
+def get_topic_exam(cur, syllabus_id):
+    """exam_overview_id of a syllabus topic, or None if the topic does not exist"""
+    cur.execute("SELECT exam_overview_id FROM syllabus WHERE syllabus_id = %s", (syllabus_id,))
+    row = cur.fetchone()
+    return row["exam_overview_id"] if row else None
+
+
+def list_exam_question_ids(cur, exam_overview_id):
+    """{question_id: syllabus_id} of the active questions of an exam"""
+    cur.execute("""
+        SELECT q.question_id, q.syllabus_id
+        FROM questions q
+        JOIN syllabus s ON s.syllabus_id = q.syllabus_id
+        WHERE s.exam_overview_id = %s AND q.is_active = TRUE
+    """, (exam_overview_id,))
+    return {row["question_id"]: row["syllabus_id"] for row in cur.fetchall()}
+
+
+def get_question_signatures(cur, question_ids):
+    """Stored near-duplicate signatures of the given questions; NULL for ones not signed yet"""
+    cur.execute("""
+        SELECT question_id, syllabus_id, text_signature
+        FROM questions
+        WHERE question_id = ANY(%s)
+    """, (list(question_ids),))
+    return cur.fetchall()
+
+
+def get_active_question_signatures(cur, exam_overview_id, question_ids):
+    """Signatures of those of the given questions that are active in the exam; NULL for ones not signed yet"""
+    cur.execute("""
+        SELECT q.question_id, q.syllabus_id, q.text_signature
+        FROM questions q
+        JOIN syllabus s ON s.syllabus_id = q.syllabus_id
+        WHERE q.question_id = ANY(%s) AND s.exam_overview_id = %s AND q.is_active = TRUE
+    """, (list(question_ids), exam_overview_id))
+    return cur.fetchall()
+
+
+def lock_unsigned_questions(cur, limit):
+    """Lock up to limit questions without a signature, skipping ones another worker holds"""
+    cur.execute("""
+        SELECT q.question_id, s.exam_overview_id, q.question_text,
+               q.option_a, q.option_b, q.option_c, q.option_d
+        FROM questions q
+        JOIN syllabus s ON s.syllabus_id = q.syllabus_id
+        WHERE q.text_signature IS NULL
+        ORDER BY q.question_id
+        LIMIT %s
+        FOR UPDATE OF q SKIP LOCKED
+    """, (limit,))
+    return cur.fetchall()
+
+
+def set_question_signatures(cur, rows):
+    """Store (question_id, signature) rows"""
+    execute_values(cur, """
+        UPDATE questions q
+        SET text_signature = v.text_signature
+        FROM (VALUES %s) AS v(question_id, text_signature)
+        WHERE q.question_id = v.question_id
+    """, rows, template="(%s::integer, %s::bytea)")
+
+
+def get_answer_key(cur, exam_overview_id):
+    """{question_id: row} of the active questions of an exam, for grading"""
+    cur.execute("""
+        SELECT q.question_id, q.syllabus_id, q.difficulty, q.correct_option
+        FROM questions q
+        JOIN syllabus s ON s.syllabus_id = q.syllabus_id
+        WHERE s.exam_overview_id = %s AND q.is_active = TRUE
+    """, (exam_overview_id,))
+    return {row["question_id"]: row for row in cur.fetchall()}
+
+
+# Users
+statements.register("user_by_email", "text", f"""
+    SELECT {columns(USER_COLUMNS)}, password
+    FROM users
+    WHERE email = $1
+""")
+
+
+def create_user(cur, user):
+    cur.execute(f"""
+        INSERT INTO users
+        (first_name, last_name, email, password, grade, date_of_birth,
+         country_code, phone_number, profile_image, school_name, city, state)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING {columns(USER_COLUMNS)}
+    """, (user.first_name, user.last_name, user.email, user.password,
+          user.grade, user.date_of_birth, user.country_code, user.phone_number,
+          user.profile_image, user.school_name, user.city, user.state))
+    return cur.fetchone()
+
+
+# Roster import: students are COPYed into a temp staging table and merged in one statement
+ROSTER_COLUMNS = ["first_name", "last_name", "email", "password", "grade", "date_of_birth",
+                  "country_code", "phone_number", "profile_image", "school_name", "city", "state"]
+
+
+def create_roster_staging(cur):
+    cur.execute("""
+        CREATE TEMP TABLE roster_staging (
+          row_number    INTEGER PRIMARY KEY,
+          first_name    VARCHAR(100),
+          last_name     VARCHAR(100),
+          email         VARCHAR(255),
+          password      VARCHAR(255),
+          grade         INTEGER,
+          date_of_birth DATE,
+          country_code  VARCHAR(5),
+          phone_number  VARCHAR(20),
+          profile_image TEXT,
+          school_name   VARCHAR(255),
+          city          VARCHAR(100),
+          state         VARCHAR(100)
+        ) ON COMMIT DROP
+    """)
+
+
+def copy_roster_rows(cur, csv_file):
+    """COPY CSV rows of (row_number, *ROSTER_COLUMNS) into the staging table"""
+    cur.copy_expert(
+        f"COPY roster_staging (row_number, {columns(ROSTER_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        csv_file
+    )
+
+
+def merge_roster(cur):
+    """Insert staged students whose email isn't registered yet (ignoring case).
+
+    Returns row_number, user_id and whether the user was created for every staged row.
+    """
+    # A staged email matching several users that differ only in case reports
+    # the oldest of them, so every staged row yields exactly one report row
+    cur.execute(f"""
+        WITH inserted AS (
+            INSERT INTO users ({columns(ROSTER_COLUMNS)})
+            SELECT {columns(ROSTER_COLUMNS, "s")}
+            FROM roster_staging s
+            WHERE NOT EXISTS (SELECT 1 FROM users u WHERE lower(u.email) = lower(s.email))
+            ORDER BY s.row_number
+            ON CONFLICT (email) DO NOTHING
+            RETURNING user_id, email
+        )
+        SELECT s.row_number, COALESCE(i.user_id, u.user_id) AS user_id, i.user_id IS NOT NULL AS created
+        FROM roster_staging s
+        LEFT JOIN inserted i ON i.email = s.email
+        LEFT JOIN LATERAL (
+            SELECT user_id FROM users WHERE lower(users.email) = lower(s.email)
+            ORDER BY user_id
+            LIMIT 1
+        ) u ON TRUE
+        ORDER BY s.row_number
+    """)
+    merged = cur.fetchall()
+
+    # An email that a concurrent signup committed while the insert waited on it
+    # is in neither the statement's snapshot nor its RETURNING; look again
+    conflicted = [row["row_number"] for row in merged if row["user_id"] is None]
+    if conflicted:
+        cur.execute("""
+            SELECT s.row_number, u.user_id
+            FROM roster_staging s
+            CROSS JOIN LATERAL (
+                SELECT user_id FROM users WHERE lower(users.email) = lower(s.email)
+                ORDER BY user_id
+                LIMIT 1
+            ) u
+            WHERE s.row_number = ANY(%s)
+        """, (conflicted,))
+        found = {row["row_number"]: row["user_id"] for row in cur.fetchall()}
+        for row in merged:
+            if row["user_id"] is None:
+                row["user_id"] = found.get(row["row_number"])
+    return merged
+
+
+def get_user_by_email(cur, email):
+    """User row including the password column"""
+    statements.execute(cur, "user_by_email", (email,))
+    return cur.fetchone()
+
+
+def user_exists(cur, user_id):
+    cur.execute("SELECT 1 FROM users WHERE user_id = %s", (user_id,))
+    return cur.fetchone() is not None
+
+
+def set_profile_image(cur, user_id, url):
+    return _update(cur, "users", "user_id", user_id, {"profile_image": url}, ["user_id"], touch=True)
+
+
+def touch_last_login(cur, user_id):
+    cur.execute("UPDATE users SET last_login = NOW() WHERE user_id = %s", (user_id,))
+
+
+# Combined & analytics
+def get_exam_overview(cur, exam_overview_id):
+    """exam → sections → syllabus → questions → notes as one JSON document, or None"""
+    cur.execute("""
+        SELECT json_build_object(
+                 'exam_overview_id', e.exam_overview_id, 'exam', e.exam,
+                 'grade', e.grade, 'level', e.level,
+                 'total_questions', e.total_questions, 'total_marks', e.total_marks,
+                 'total_time_mins', e.total_time_mins
+               ) AS exam,
+               COALESCE((
+                 SELECT json_agg(json_build_object(
+                          'section_id', s.section_id, 'section', s.section,
+                          'no_of_questions', s.no_of_questions,
+                          'marks_per_question', s.marks_per_question,
+                          'total_marks', s.total_marks,
+                          'syllabus', COALESCE((
+                            SELECT json_agg(json_build_object(
+                                     'syllabus_id', sy.syllabus_id, 'topic', sy.topic,
+                                     'subtopic', sy.subtopic,
+                                     'questions', COALESCE((
+                                       SELECT json_agg(json_build_object(
+                                                'question_id', q.question_id,
+                                                'difficulty', q.difficulty,
+                                                'question_text', q.question_text,
+                                                'option_a', q.option_a, 'option_b', q.option_b,
+                                                'option_c', q.option_c, 'option_d', q.option_d,
+                                                'correct_option', q.correct_option,
+                                                'solution', q.solution, 'figure', q.figure
+                                              ) ORDER BY q.question_id)
+                                       FROM questions q
+                                       WHERE q.syllabus_id = sy.syllabus_id AND q.is_active = TRUE
+                                     ), '[]'::json)
+                                   ) ORDER BY sy.syllabus_id)
+                            FROM syllabus sy
+                            WHERE sy.section_id = s.section_id
+                          ), '[]'::json)
+                        ) ORDER BY s.section_id)
+                 FROM sections s
+                 WHERE s.exam_overview_id = e.exam_overview_id
+               ), '[]'::json) AS sections,
+               COALESCE((
+                 SELECT json_agg(json_build_object('note_id', n.note_id, 'note', n.note)
+                                 ORDER BY n.note_id)
+                 FROM notes n
+                 WHERE n.exam_overview_id = e.exam_overview_id
+               ), '[]'::json) AS notes
+        FROM exam_overview e
+        WHERE e.exam_overview_id = %s
+    """, (exam_overview_id,))
+    return cur.fetchone()
+
+
+def get_exam_analytics(cur, exam_overview_id):
+    """Topic count and active questions by difficulty, or None if the exam does not exist"""
+    cur.execute("""
+        SELECT e.exam_overview_id,
+               (SELECT COUNT(*) FROM syllabus s
+                WHERE s.exam_overview_id = e.exam_overview_id) AS total_topics,
+               COALESCE((
+                 SELECT json_agg(json_build_object('difficulty', d.difficulty, 'count', d.count))
+                 FROM (
+                   SELECT q.difficulty, COUNT(*) AS count
+                   FROM questions q
+                   JOIN syllabus s ON q.syllabus_id = s.syllabus_id
+                   WHERE s.exam_overview_id = e.exam_overview_id AND q.is_active = TRUE
+                   GROUP BY q.difficulty
+                 ) d
+               ), '[]'::json) AS questions_by_difficulty
+        FROM exam_overview e
+        WHERE e.exam_overview_id = %s
+    """, (exam_overview_id,))
+    return cur.fetchone()
+
+
+# Topic mastery
+def upsert_topic_stats(cur, rows):
+    """Add (user_id, syllabus_id, difficulty, attempts, correct) deltas to user_topic_stats.
+
+    Rows for users or topics deleted since they were recorded are dropped.
+    """
+    execute_values(cur, """
+        INSERT INTO user_topic_stats (user_id, syllabus_id, difficulty, attempts, correct)
+        SELECT v.user_id, v.syllabus_id, v.difficulty, v.attempts, v.correct
+        FROM (VALUES %s) AS v(user_id, syllabus_id, difficulty, attempts, correct)
+        JOIN users u ON u.user_id = v.user_id
+        JOIN syllabus s ON s.syllabus_id = v.syllabus_id
+        ON CONFLICT (user_id, syllabus_id, difficulty) DO UPDATE
+        SET attempts = user_topic_stats.attempts + EXCLUDED.attempts,
+            correct = user_topic_stats.correct + EXCLUDED.correct,
+            updated_at = NOW()
+    """, rows, template="(%s::integer, %s::integer, %s::varchar, %s::integer, %s::integer)")
+
+
+def get_topic_mastery(cur, user_id, exam_overview_id):
+    """Every syllabus topic of an exam with the user's stored attempts per difficulty"""
+    cur.execute("""
+        SELECT s.syllabus_id, s.section_id, sec.section, s.topic, s.subtopic,
+               COALESCE(
+                 json_object_agg(t.difficulty, json_build_object('attempts', t.attempts,
+                                                                 'correct', t.correct))
+                   FILTER (WHERE t.difficulty IS NOT NULL),
+                 '{}'::json
+               ) AS by_difficulty
+        FROM syllabus s
+        JOIN sections sec ON sec.section_id = s.section_id
+        LEFT JOIN user_topic_stats t ON t.syllabus_id = s.syllabus_id AND t.user_id = %s
+        WHERE s.exam_overview_id = %s
+        GROUP BY s.syllabus_id, sec.section
+        ORDER BY s.syllabus_id
+    """, (user_id, exam_overview_id))
+    return cur.fetchall()
+
+
+# Exam attempts: live sessions keep answers in memory and write them behind in batches
+ATTEMPT_COLUMNS = ["attempt_id", "user_id", "exam_overview_id", "status", "started_at",
+                   "deadline", "submitted_at", "score"]
+
+
+def open_attempt(cur, user_id, exam_overview_id, total_time_mins):
+    """The user's in-progress attempt at an exam, started now if there is none.
+
+    remaining_secs is measured by the database clock, so app servers with a
+    skewed clock still enforce the same deadline. None only if the attempt in
+    the way kept being closed between the insert and the select.
+    """
+    for _ in range(3):
+        cur.execute(f"""
+            INSERT INTO exam_attempts (user_id, exam_overview_id, deadline)
+            VALUES (%s, %s, NOW() + make_interval(mins => %s))
+            ON CONFLICT (user_id, exam_overview_id) WHERE status = 'in_progress' DO NOTHING
+            RETURNING {columns(ATTEMPT_COLUMNS)}, EXTRACT(EPOCH FROM deadline - NOW()) AS remaining_secs
+        """, (user_id, exam_overview_id, total_time_mins))
+        attempt = cur.fetchone()
+        if attempt:
+            return attempt
+
+        cur.execute(f"""
+            SELECT {columns(ATTEMPT_COLUMNS)}, EXTRACT(EPOCH FROM deadline - NOW()) AS remaining_secs
+            FROM exam_attempts
+            WHERE user_id = %s AND exam_overview_id = %s AND status = 'in_progress'
+        """, (user_id, exam_overview_id))
+        attempt = cur.fetchone()
+        if attempt:
+            return attempt
+        # The conflicting attempt was submitted or expired in between, start a new one
+    return None
+
+
+def list_attempt_answers(cur, attempt_id):
+    """{question_id: selected_option} saved for an attempt"""
+    cur.execute("""
+        SELECT question_id, selected_option
+        FROM attempt_answers
+        WHERE attempt_id = %s
+    """, (attempt_id,))
+    return {row["question_id"]: row["selected_option"] for row in cur.fetchall()}
+
+
+def upsert_attempt_answers(cur, rows):
+    """Save (attempt_id, question_id, selected_option, answered_at) rows, newest answer winning.
+
+    Rows for attempts that are no longer in progress are dropped.
+    """
+    execute_values(cur, """
+        INSERT INTO attempt_answers (attempt_id, question_id, selected_option, answered_at)
+        SELECT v.attempt_id, v.question_id, v.selected_option, v.answered_at
+        FROM (VALUES %s) AS v(attempt_id, question_id, selected_option, answered_at)
+        JOIN exam_attempts a ON a.attempt_id = v.attempt_id AND a.status = 'in_progress'
+        ON CONFLICT (attempt_id, question_id) DO UPDATE
+        SET selected_option = EXCLUDED.selected_option, answered_at = EXCLUDED.answered_at
+        WHERE attempt_answers.answered_at <= EXCLUDED.answered_at
+    """, rows, template="(%s::integer, %s::integer, %s::varchar, %s::timestamptz)")
+
+
+def finish_attempt(cur, attempt_id, status):
+    """Close an in-progress attempt and score it; returns the attempt and whether this call closed it"""
+    cur.execute(f"""
+        UPDATE exam_attempts a
+        SET status = %s, submitted_at = NOW(),
+            score = (SELECT COUNT(*)
+                     FROM attempt_answers aa
+                     JOIN questions q ON q.question_id = aa.question_id
+                     WHERE aa.attempt_id = a.attempt_id
+                       AND upper(trim(aa.selected_option)) = upper(trim(q.correct_option)))
+        WHERE attempt_id = %s AND status = 'in_progress'
+        RETURNING {columns(ATTEMPT_COLUMNS)}
+    """, (status, attempt_id))
+    attempt = cur.fetchone()
+    if attempt:
+        return attempt, True
+
+    cur.execute(f"SELECT {columns(ATTEMPT_COLUMNS)} FROM exam_attempts WHERE attempt_id = %s", (attempt_id,))
+    return cur.fetchone(), False
+
+
+def expire_overdue_attempts(cur, grace_secs, limit):
+    """Expire and score up to limit attempts still open grace_secs past their deadline.
+
+    SKIP LOCKED lets every worker sweep at once without waiting on each other
+    or on a student submitting at the same moment.
+    """
+    cur.execute(f"""
+        UPDATE exam_attempts a
+        SET status = 'expired', submitted_at = NOW(),
+            score = (SELECT COUNT(*)
+                     FROM attempt_answers aa
+                     JOIN questions q ON q.question_id = aa.question_id
+                     WHERE aa.attempt_id = a.attempt_id
+                       AND upper(trim(aa.selected_option)) = upper(trim(q.correct_option)))
+        WHERE attempt_id IN (
+            SELECT attempt_id FROM exam_attempts
+            WHERE status = 'in_progress' AND deadline < NOW() - make_interval(secs => %s)
+            ORDER BY deadline
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING {columns(ATTEMPT_COLUMNS)}
+    """, (grace_secs, limit))
+    return cur.fetchall()
+
+
+def list_attempt_results(cur, attempt_ids):
+    """(user_id, syllabus_id, difficulty, correct) of every answered question of the given attempts"""
+    cur.execute("""
+        SELECT a.user_id, q.syllabus_id, q.difficulty,
+               COALESCE(upper(trim(aa.selected_option)) = upper(trim(q.correct_option)), FALSE) AS correct
+        FROM attempt_answers aa
+        JOIN exam_attempts a ON a.attempt_id = aa.attempt_id
+        JOIN questions q ON q.question_id = aa.question_id
+        WHERE aa.attempt_id = ANY(%s) AND aa.selected_option IS NOT NULL
+    """, (list(attempt_ids),))
+    return cur.fetchall()
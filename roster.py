@@ -0,0 +1,153 @@
+import csv
+import io
+import os
+import tempfile
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+import psycopg2
+from database import get_db
+import repository
+from models import UserSignup
+
+ROSTER_MAX_BYTES = int(os.getenv("ROSTER_MAX_BYTES", str(20 * 1024 * 1024)))
+ROSTER_MAX_ROWS = int(os.getenv("ROSTER_MAX_ROWS", "50000"))
+COPY_BATCH_ROWS = int(os.getenv("ROSTER_COPY_BATCH_ROWS", "5000"))  # rows per COPY into staging
+
+CSV_TYPES = {"text/csv", "application/csv", "text/plain"}
+REQUIRED_COLUMNS = {"first_name", "last_name", "email", "password"}
+# Columns that can be given once for the whole roster as query parameters
+SCHOOL_COLUMNS = ("school_name", "city", "state")
+# Taken exactly as written, like /signup; every other cell is trimmed
+RAW_COLUMNS = {"password"}
+
+
+async def spool_upload(request: Request):
+    """Stream the raw CSV body to a temporary file; the caller closes it"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in CSV_TYPES:
+        raise HTTPException(status_code=415, detail="Send the roster as text/csv")
+
+    spooled = tempfile.TemporaryFile()
+    size = 0
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > ROSTER_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"Roster exceeds {ROSTER_MAX_BYTES} bytes")
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+
+    if size == 0:
+        spooled.close()
+        raise HTTPException(status_code=400, detail="Empty roster")
+    spooled.seek(0)
+    return spooled
+
+
+def _validation_message(e):
+    return "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors())
+
+
+def _read_header(reader):
+    if not reader.fieldnames:
+        raise HTTPException(status_code=400, detail="Roster has no header row")
+    header = [name.strip().lower() for name in reader.fieldnames]
+
+    unknown = [name for name in header if name not in repository.ROSTER_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}")
+    missing = REQUIRED_COLUMNS - set(header)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing columns: {', '.join(sorted(missing))}")
+    reader.fieldnames = header
+
+
+def _rows(spooled, defaults):
+    """(row number, values or None, message) for every data row of the CSV"""
+    reader = csv.DictReader(io.TextIOWrapper(spooled, encoding="utf-8-sig", newline=""))
+    try:
+        _read_header(reader)
+        for row_number, record in enumerate(reader, start=1):
+            if row_number > ROSTER_MAX_ROWS:
+                raise HTTPException(status_code=413, detail=f"Roster exceeds {ROSTER_MAX_ROWS} rows")
+            if None in record:
+                yield row_number, None, "More fields than columns in the header"
+                continue
+            values = {name: (value if name in RAW_COLUMNS else (value or "").strip()) or None
+                      for name, value in record.items()}
+            for name in SCHOOL_COLUMNS:
+                if values.get(name) is None:
+                    values[name] = defaults.get(name)
+            yield row_number, values, None
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Roster must be UTF-8 encoded")
+    except csv.Error as e:
+        raise HTTPException(status_code=400, detail=f"Malformed CSV at line {reader.line_num}: {str(e)}")
+
+
+def import_roster(spooled, defaults):
+    """Validate, de-duplicate and insert a CSV roster in one transaction; returns the per-row report"""
+    report = []
+    staged = {}   # row number → its report entry, filled in after the merge
+    seen = {}     # lower-cased email → first row with it
+
+    batch = io.StringIO()
+    writer = csv.writer(batch)
+
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            repository.create_roster_staging(cur)
+
+            def copy_batch():
+                batch.seek(0)
+                repository.copy_roster_rows(cur, batch)
+                batch.seek(0)
+                batch.truncate()
+
+            for row_number, values, message in _rows(spooled, defaults):
+                email = values.get("email") if values else None
+                if values is not None:
+                    try:
+                        student = UserSignup(**{name: value for name, value in values.items() if value is not None})
+                    except ValidationError as e:
+                        message = _validation_message(e)
+                if message:
+                    report.append({"row": row_number, "email": email, "status": "invalid", "message": message})
+                    continue
+
+                key = student.email.lower()
+                if key in seen:
+                    report.append({"row": row_number, "email": email, "status": "duplicate",
+                                   "message": f"Same email as row {seen[key]}"})
+                    continue
+                seen[key] = row_number
+
+                entry = staged[row_number] = {"row": row_number, "email": student.email}
+                report.append(entry)
+                writer.writerow([row_number] + [getattr(student, name) for name in repository.ROSTER_COLUMNS])
+                if len(staged) % COPY_BATCH_ROWS == 0:
+                    copy_batch()
+
+            copy_batch()
+            try:
+                merged = repository.merge_roster(cur)
+                conn.commit()
+            except psycopg2.IntegrityError as e:
+                conn.rollback()
+                raise repository.integrity_error(e)
+
+    for row in merged:
+        entry = staged[row["row_number"]]
+        entry["user_id"] = row["user_id"]
+        if row["created"]:
+            entry["status"] = "created"
+        else:
+            entry["status"] = "existing"
+            entry["message"] = "Email already registered"
+
+    counts = {status: 0 for status in ("created", "existing", "duplicate", "invalid")}
+    for entry in report:
+        counts[entry["status"]] += 1
+    return {"total": len(report), **counts, "rows": report}
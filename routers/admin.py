@@ -0,0 +1,50 @@
+from fastapi import APIRouter, HTTPException, Header, Depends, Query
+from typing import Optional
+from fastapi.responses import FileResponse
+import os
+import secrets
+import profiler
+import slowlog
+from singleflight import reads
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def is_admin(token):
+    return bool(ADMIN_TOKEN) and secrets.compare_digest(token or "", ADMIN_TOKEN)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints need the X-Admin-Token header to match ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin endpoints disabled, set ADMIN_TOKEN")
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)], route_class=profiler.ProfiledRoute)
+
+@router.get("/singleflight")
+def get_singleflight_stats():
+    """How many identical concurrent reads were collapsed into one"""
+    return reads.stats()
+
+@router.get("/slow-queries")
+def get_slow_queries(limit: int = Query(50, ge=1, le=1000)):
+    """Statements slower than SLOW_QUERY_MS in this worker, newest first"""
+    return {"stats": slowlog.stats(), "queries": slowlog.entries(limit)}
+
+@router.delete("/slow-queries", status_code=204)
+def clear_slow_queries():
+    """Empty this worker's slow-query log"""
+    slowlog.clear()
+
+@router.get("/profiles")
+def get_profiles():
+    """Stored request profiles of this worker, newest first"""
+    return profiler.list_profiles()
+
+@router.get("/profiles/{name}")
+def get_profile(name: str):
+    """One profile in folded-stack format, ready for flamegraph.pl or speedscope"""
+    path = profiler.path_for(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain")
@@ -1,103 +1,38 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional
 from database import get_db
+import repository
+from singleflight import reads
+from profiler import ProfiledRoute
 
-router = APIRouter(tags=["Combined & Analytics"])
+router = APIRouter(tags=["Combined & Analytics"], route_class=ProfiledRoute)
 
 @router.get("/exams/{exam_overview_id}/overview")
-def get_full_exam_overview(exam_overview_id: int):
+async def get_full_exam_overview(exam_overview_id: int):
     """Returns exam → sections → syllabus → questions → notes"""
-    with get_db() as conn:
+    overview = await reads.do(("overview", exam_overview_id), lambda: _load_overview(exam_overview_id))
+
+    if not overview:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    return overview
+
+def _load_overview(exam_overview_id):
+    with get_db(readonly=True) as conn:
         with conn.cursor() as cur:
-            # Get exam
-            cur.execute("""
-                SELECT exam_overview_id, exam, grade, level,
-                       total_questions, total_marks, total_time_mins
-                FROM exam_overview
-                WHERE exam_overview_id = %s
-            """, (exam_overview_id,))
-            exam = cur.fetchone()
-            
-            if not exam:
-                raise HTTPException(status_code=404, detail="Exam not found")
-            
-            # Get sections
-            cur.execute("""
-                SELECT section_id, section, no_of_questions,
-                       marks_per_question, total_marks
-                FROM sections
-                WHERE exam_overview_id = %s
-            """, (exam_overview_id,))
-            sections = cur.fetchall()
-            
-            # Get syllabus for each section
-            for section in sections:
-                cur.execute("""
-                    SELECT syllabus_id, topic, subtopic
-                    FROM syllabus
-                    WHERE section_id = %s
-                """, (section['section_id'],))
-                section['syllabus'] = cur.fetchall()
-                
-                # Get questions for each syllabus topic
-                for syllabus_item in section['syllabus']:
-                    cur.execute("""
-                        SELECT question_id, difficulty, question_text,
-                               option_a, option_b, option_c, option_d,
-                               correct_option, solution
-                        FROM questions
-                        WHERE syllabus_id = %s AND is_active = TRUE
-                    """, (syllabus_item['syllabus_id'],))
-                    syllabus_item['questions'] = cur.fetchall()
-            
-            # Get notes
-            cur.execute("""
-                SELECT note_id, note
-                FROM notes
-                WHERE exam_overview_id = %s
-            """, (exam_overview_id,))
-            notes = cur.fetchall()
-            
-            return {
-                "exam": exam,
-                "sections": sections,
-                "notes": notes
-            }
+            return repository.get_exam_overview(cur, exam_overview_id)
 
 @router.get("/analytics/exam/{exam_overview_id}")
 def get_exam_analytics(exam_overview_id: int):
     """Count of topics and questions by difficulty"""
-    with get_db() as conn:
+    with get_db(readonly=True) as conn:
         with conn.cursor() as cur:
-            # Check if exam exists
-            cur.execute("SELECT 1 FROM exam_overview WHERE exam_overview_id = %s", 
-                       (exam_overview_id,))
-            if not cur.fetchone():
+            analytics = repository.get_exam_analytics(cur, exam_overview_id)
+
+            if not analytics:
                 raise HTTPException(status_code=404, detail="Exam not found")
-            
-            # Count total topics
-            cur.execute("""
-                SELECT COUNT(*) as total_topics
-                FROM syllabus
-                WHERE exam_overview_id = %s
-            """, (exam_overview_id,))
-            topic_count = cur.fetchone()
-            
-            # Count questions by difficulty
-            cur.execute("""
-                SELECT q.difficulty, COUNT(*) as count
-                FROM questions q
-                JOIN syllabus s ON q.syllabus_id = s.syllabus_id
-                WHERE s.exam_overview_id = %s AND q.is_active = TRUE
-                GROUP BY q.difficulty
-            """, (exam_overview_id,))
-            difficulty_counts = cur.fetchall()
-            
-            return {
-                "exam_overview_id": exam_overview_id,
-                "total_topics": topic_count['total_topics'],
-                "questions_by_difficulty": difficulty_counts
-            }
+
+            return analytics
 
 # @router.get("/search/questions")
 # def search_questions(
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, HTTPException
 import psycopg2
 from database import get_db
+import repository
 from models import UserSignup, UserLogin, UserResponse
+from profiler import ProfiledRoute
 
-router = APIRouter(tags=["Authentication"])
+router = APIRouter(tags=["Authentication"], route_class=ProfiledRoute)
 
 @router.post("/signup", response_model=UserResponse, status_code=201)
 def signup(user: UserSignup):
@@ -11,73 +13,38 @@ def signup(user: UserSignup):
     with get_db() as conn:
         with conn.cursor() as cur:
             try:
-                cur.execute("""
-                    INSERT INTO users 
-                    (first_name, last_name, email, password, grade, date_of_birth,
-                     country_code, phone_number, profile_image, school_name, city, state)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING user_id, first_name, last_name, email, grade, date_of_birth,
-                              country_code, phone_number, profile_image, school_name, 
-                              city, state, email_verified, phone_verified, last_login,
-                              is_active, created_at, updated_at
-                """, (user.first_name, user.last_name, user.email, user.password, 
-                      user.grade, user.date_of_birth, user.country_code, user.phone_number,
-                      user.profile_image, user.school_name, user.city, user.state))
-                
-                new_user = cur.fetchone()
+                new_user = repository.create_user(cur, user)
                 conn.commit()
                 return new_user
-                
+
             except psycopg2.IntegrityError as e:
                 conn.rollback()
-                error_msg = str(e)
-                print(f"Database Error: {error_msg}")
-                
-                if "unique constraint" in error_msg.lower() and "email" in error_msg.lower():
-                    raise HTTPException(status_code=400, detail="Email already registered")
-                else:
-                    raise HTTPException(status_code=400, detail=f"Registration failed: {error_msg}")
+                raise repository.integrity_error(e)
 
 @router.post("/login", response_model=UserResponse)
 def login(credentials: UserLogin):
     """Login user"""
     with get_db() as conn:
         with conn.cursor() as cur:
-            cur.execute("""
-                SELECT user_id, first_name, last_name, email, grade, date_of_birth,
-                       country_code, phone_number, profile_image, school_name, 
-                       city, state, email_verified, phone_verified, last_login,
-                       is_active, created_at, updated_at, password
-                FROM users
-                WHERE email = %s
-            """, (credentials.email,))
-            
-            user = cur.fetchone()
-            
+            user = repository.get_user_by_email(cur, credentials.email)
+
             if not user:
                 raise HTTPException(status_code=401, detail="Invalid email or password")
-            
+
             # Check if user is active
             if not user['is_active']:
                 raise HTTPException(status_code=403, detail="Account is deactivated")
-            
+
             # Check password
             if user['password'] != credentials.password:
                 raise HTTPException(status_code=401, detail="Invalid email or password")
-            
+
             # Update last_login timestamp
-            cur.execute("""
-                UPDATE users
-                SET last_login = NOW()
-                WHERE user_id = %s
-            """, (user['user_id'],))
+            repository.touch_last_login(cur, user['user_id'])
             conn.commit()
-            
+
             # Remove password from response
             user_data = dict(user)
             del user_data['password']
-            
-            # Update last_login in response
-            user_data['last_login'] = user['last_login']
-            
+
             return user_data
\ No newline at end of file
@@ -2,40 +2,29 @@ from fastapi import APIRouter, HTTPException
 from typing import List
 import psycopg2
 from database import get_db
-from models import ExamCreate, ExamUpdate, ExamResponse
+import cache
+import jobs
+import repository
+from models import ExamCreate, ExamUpdate, ExamResponse, JobResponse, DeleteExamPayload
+from profiler import ProfiledRoute
 
-router = APIRouter(prefix="/exams", tags=["Exam Overview"])
+router = APIRouter(prefix="/exams", tags=["Exam Overview"], route_class=ProfiledRoute)
 
 @router.get("", response_model=List[ExamResponse])
 def get_all_exams():
     """Get all exams (filters optional)"""
-    with get_db() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT exam_overview_id, exam, grade, level, 
-                       total_questions, total_marks, total_time_mins
-                FROM exam_overview
-                ORDER BY exam_overview_id
-            """)
-            exams = cur.fetchall()
-            return exams
+    return cache.exams()
 
 @router.get("/{exam_overview_id}", response_model=ExamResponse)
 def get_exam_details(exam_overview_id: int):
     """Get details of a single exam"""
-    with get_db() as conn:
+    with get_db(readonly=True) as conn:
         with conn.cursor() as cur:
-            cur.execute("""
-                SELECT exam_overview_id, exam, grade, level, 
-                       total_questions, total_marks, total_time_mins
-                FROM exam_overview
-                WHERE exam_overview_id = %s
-            """, (exam_overview_id,))
-            exam = cur.fetchone()
-            
+            exam = repository.get_exam(cur, exam_overview_id)
+
             if not exam:
                 raise HTTPException(status_code=404, detail="Exam not found")
-            
+
             return exam
 
 @router.post("", response_model=ExamResponse, status_code=201)
@@ -44,76 +33,75 @@ def create_exam(exam: ExamCreate):
     with get_db() as conn:
         with conn.cursor() as cur:
             try:
-                cur.execute("""
-                    INSERT INTO exam_overview 
-                    (exam, grade, level, total_questions, total_marks, total_time_mins)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    RETURNING exam_overview_id, exam, grade, level, 
-                              total_questions, total_marks, total_time_mins
-                """, (exam.exam, exam.grade, exam.level, exam.total_questions, 
-                      exam.total_marks, exam.total_time_mins))
-                
-                new_exam = cur.fetchone()
+                new_exam = repository.create_exam(cur, exam)
+                cache.publish(cur, "exam_overview", new_exam["exam_overview_id"])
                 conn.commit()
                 return new_exam
-                
+
             except psycopg2.IntegrityError as e:
                 conn.rollback()
-                # Print the actual error for debugging
-                print(f"Database Error: {str(e)}")
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Database constraint violation: {str(e)}"
-                )
+                raise repository.integrity_error(e)
 
 @router.put("/{exam_overview_id}", response_model=ExamResponse)
 def update_exam(exam_overview_id: int, exam: ExamUpdate):
     """Update exam details"""
     with get_db() as conn:
         with conn.cursor() as cur:
-            updates = []
-            values = []
-            
-            if exam.total_marks is not None:
-                updates.append("total_marks = %s")
-                values.append(exam.total_marks)
-            
-            if exam.total_time_mins is not None:
-                updates.append("total_time_mins = %s")
-                values.append(exam.total_time_mins)
-            
-            if not updates:
+            fields = exam.model_dump(exclude_none=True)
+
+            if not fields:
                 raise HTTPException(status_code=400, detail="No fields to update")
-            
-            values.append(exam_overview_id)
-            
-            cur.execute(f"""
-                UPDATE exam_overview
-                SET {', '.join(updates)}
-                WHERE exam_overview_id = %s
-                RETURNING exam_overview_id, exam, grade, level, 
-                          total_questions, total_marks, total_time_mins
-            """, values)
-            
-            updated_exam = cur.fetchone()
-            
+
+            try:
+                updated_exam = repository.update_exam(cur, exam_overview_id, fields)
+            except psycopg2.IntegrityError as e:
+                conn.rollback()
+                raise repository.integrity_error(e)
+
             if not updated_exam:
                 raise HTTPException(status_code=404, detail="Exam not found")
-            
+
+            cache.publish(cur, "exam_overview", exam_overview_id)
             conn.commit()
             return updated_exam
 
-@router.delete("/{exam_overview_id}", status_code=204)
+@router.delete("/{exam_overview_id}", response_model=JobResponse, status_code=202)
 def delete_exam(exam_overview_id: int):
-    """Delete exam (cascade deletes all linked data)"""
+    """Delete exam (cascade deletes all linked data) in a background job"""
     with get_db() as conn:
         with conn.cursor() as cur:
-            cur.execute("""
-                DELETE FROM exam_overview
-                WHERE exam_overview_id = %s
-            """, (exam_overview_id,))
-            
-            if cur.rowcount == 0:
-                raise HTTPException(status_code=404, detail="Exam not found")
-            
+            payload = {"exam_overview_id": exam_overview_id}
+            _check_exam_exists(cur, payload)
+            job = jobs.enqueue(cur, "delete_exam", payload)
+            conn.commit()
+            jobs.wake()
+            return job
+
+def _check_exam_exists(cur, payload):
+    if not repository.exam_exists(cur, payload["exam_overview_id"]):
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+@jobs.handler("delete_exam", DeleteExamPayload, check=_check_exam_exists)
+def run_delete_exam(job):
+    """Delete questions in batches with progress, then the exam and its remaining children"""
+    exam_overview_id = job.payload["exam_overview_id"]
+
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            total = repository.count_exam_questions(cur, exam_overview_id)
+            conn.commit()
+
+            deleted = 0
+            while True:
+                batch = repository.delete_exam_questions(cur, exam_overview_id)
+                conn.commit()
+                if batch == 0:
+                    break
+                deleted += batch
+                job.report(min(95, deleted * 95 // max(total, 1)), f"Deleted {deleted} of {total} questions")
+
+            existed = repository.delete_exam(cur, exam_overview_id)
+            cache.publish(cur, "exam_overview", exam_overview_id)
             conn.commit()
+
+    return {"exam_overview_id": exam_overview_id, "questions_deleted": deleted, "exam_deleted": existed}
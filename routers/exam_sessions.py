@@ -0,0 +1,115 @@
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+import asyncio
+import json
+import attempts
+from profiler import ProfiledRoute, run_in_threadpool
+
+router = APIRouter(tags=["Exam Sessions"], route_class=ProfiledRoute)
+
+# Protocol (JSON text frames)
+#   server → {"type": "started", "attempt_id", "remaining_secs", "answers": {question_id: option}}
+#   client → {"type": "answer", "question_id": 12, "option": "B"}  (option null clears it)
+#   server → {"type": "saved", "question_id", "option", "remaining_secs"}
+#   client → {"type": "time"}    server → {"type": "time", "remaining_secs"}
+#   client → {"type": "submit"}  server → {"type": "result", "score", ...} and closes
+# When the clock runs out the server sends the result with status "expired" and closes.
+# Attempts abandoned past their deadline are expired and scored by a sweep on the server.
+# Close codes 4000 + HTTP status report why a session could not be opened.
+
+async def _close_with_result(websocket, result):
+    await websocket.send_json(result)
+    await websocket.close(code=1000)
+
+def _reply(session, text):
+    """Handle one client message against the in-memory session; returns the reply, None on submit"""
+    if len(text) > attempts.MAX_MESSAGE_CHARS:
+        return {"type": "error", "detail": "Message too large"}
+    try:
+        message = json.loads(text)
+        kind = message["type"]
+    except (ValueError, TypeError, KeyError):
+        return {"type": "error", "detail": "Messages must be JSON objects with a type"}
+
+    if kind == "submit":
+        return None
+    if kind == "time":
+        return {"type": "time", "remaining_secs": int(session.remaining())}
+    if kind == "answer":
+        question_id = message.get("question_id")
+        if not isinstance(question_id, int):
+            return {"type": "error", "detail": "question_id must be an integer"}
+        error = session.answer(question_id, message.get("option"))
+        if error:
+            return {"type": "error", "detail": error}
+        return {"type": "saved", "question_id": question_id, "option": session.answers.get(question_id),
+                "remaining_secs": int(session.remaining())}
+    return {"type": "error", "detail": f"Unknown message type: {kind}"}
+
+@router.websocket("/users/{user_id}/exams/{exam_overview_id}/session")
+async def exam_session(websocket: WebSocket, user_id: int, exam_overview_id: int):
+    """Timed exam attempt with answers autosaved in batches"""
+    await websocket.accept()
+    if attempts.at_capacity():
+        await websocket.close(code=1013, reason="Too many live sessions, try again shortly")
+        return
+
+    try:
+        kind, opened = await run_in_threadpool(attempts.open_session, user_id, exam_overview_id)
+    except HTTPException as e:
+        await websocket.close(code=4000 + e.status_code, reason=e.detail)
+        return
+    if kind == "result":
+        await _close_with_result(websocket, opened)
+        return
+
+    session = opened
+    replaced = attempts.register(session, websocket)
+    if replaced is not None:
+        try:
+            await replaced.close(code=4001, reason="Session continued on another connection")
+        except RuntimeError:
+            pass  # already closed
+
+    try:
+        await websocket.send_json({
+            "type": "started",
+            "attempt_id": session.attempt_id,
+            "remaining_secs": int(session.remaining()),
+            "answers": session.answers,
+        })
+
+        # The receive timeout is the exam clock, so no timer task per session
+        while session.remaining() > 0:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), timeout=session.remaining())
+            except asyncio.TimeoutError:
+                break
+            if message["type"] == "websocket.disconnect":
+                return  # the attempt stays open; reconnecting resumes it
+            text = message.get("text")
+            if text is None:
+                await websocket.send_json({"type": "error", "detail": "Send JSON text frames"})
+                continue
+
+            reply = _reply(session, text)
+            if reply is None:
+                break
+            await websocket.send_json(reply)
+
+        status = "submitted" if session.remaining() > 0 else "expired"
+        while True:
+            try:
+                result = await run_in_threadpool(attempts.finish, session, status)
+                break
+            except HTTPException as e:
+                if e.status_code != 503:
+                    await websocket.close(code=4000 + e.status_code, reason=e.detail)
+                    return
+                await websocket.send_json({"type": "error", "detail": e.detail})
+                await asyncio.sleep(attempts.FLUSH_INTERVAL)
+        await _close_with_result(websocket, result)
+
+    except (WebSocketDisconnect, RuntimeError):
+        return  # client went away mid-send; the attempt can be resumed
+    finally:
+        attempts.unregister(session, websocket)
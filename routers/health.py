@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+import database
+import warmup
+from profiler import ProfiledRoute
+
+router = APIRouter(prefix="/health", tags=["Health"], route_class=ProfiledRoute)
+
+@router.get("/live")
+def liveness():
+    """Process is up and serving requests"""
+    return {"status": "alive"}
+
+@router.get("/ready")
+def readiness():
+    """Pools are open and caches warm; 503 until then"""
+    body = {**warmup.STARTUP, "replicas": database.replica_status()}
+    status_code = 200 if warmup.STARTUP["ready"] else 503
+    return JSONResponse(status_code=status_code, content=body)
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import ValidationError
+from database import get_db
+import jobs
+from models import JobCreate, JobResponse
+from profiler import ProfiledRoute
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"], route_class=ProfiledRoute)
+
+@router.post("", response_model=JobResponse, status_code=202)
+def enqueue_job(job: JobCreate):
+    """Queue a background job of a registered kind"""
+    if job.kind not in jobs.HANDLERS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind, use one of: {', '.join(jobs.HANDLERS)}")
+    try:
+        payload = jobs.parse_payload(job.kind, job.payload)
+    except ValidationError as e:
+        errors = "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors())
+        raise HTTPException(status_code=400, detail=f"Invalid payload: {errors}")
+
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            check = jobs.CHECKS.get(job.kind)
+            if check:
+                check(cur, payload)
+            new_job = jobs.enqueue(cur, job.kind, payload)
+            conn.commit()
+            jobs.wake()
+            return new_job
+
+@router.get("/{job_id}", response_model=JobResponse)
+def get_job_status(job_id: int):
+    """Poll a job's status, progress and result"""
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            job = jobs.get_job(cur, job_id)
+
+            if not job:
+                raise HTTPException(status_code=404, detail="Job not found")
+
+            return job
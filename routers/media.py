@@ -0,0 +1,78 @@
+from fastapi import APIRouter, HTTPException, Header, Request, Response
+from typing import Optional
+from profiler import ProfiledRoute, run_in_threadpool
+from fastapi.responses import FileResponse
+import os
+from database import get_db
+import cache
+import media
+import repository
+from models import MediaResponse
+
+router = APIRouter(tags=["Media"], route_class=ProfiledRoute)
+
+# Uploads take the raw image as the request body with its Content-Type,
+# e.g. curl --data-binary @photo.jpg -H "Content-Type: image/jpeg"
+
+def _require(exists, key, detail):
+    # Checked before the upload is stored, so a 404 leaves no file behind
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            if not exists(cur, key):
+                raise HTTPException(status_code=404, detail=detail)
+
+@router.post("/users/{user_id}/profile_image", response_model=MediaResponse, status_code=201)
+async def upload_profile_image(user_id: int, request: Request):
+    """Upload a profile image and set it on the user"""
+    await run_in_threadpool(_require, repository.user_exists, user_id, "User not found")
+    stored = await media.store_upload(request, media.PROFILE_VARIANTS)
+    await run_in_threadpool(_set_profile_image, user_id, stored["url"])
+    return stored
+
+def _set_profile_image(user_id, url):
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            if not repository.set_profile_image(cur, user_id, url):
+                raise HTTPException(status_code=404, detail="User not found")
+            conn.commit()
+
+@router.post("/questions/{question_id}/figure", response_model=MediaResponse, status_code=201)
+async def upload_question_figure(question_id: int, request: Request):
+    """Upload a diagram and attach it to a question"""
+    await run_in_threadpool(_require, repository.question_exists, question_id, "Question not found")
+    stored = await media.store_upload(request, media.FIGURE_VARIANTS)
+    await run_in_threadpool(_set_question_figure, question_id, stored["url"])
+    return stored
+
+def _set_question_figure(question_id, url):
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            updated = repository.set_question_figure(cur, question_id, url)
+            if not updated:
+                raise HTTPException(status_code=404, detail="Question not found")
+            cache.publish(cur, "questions", repository.get_topic_exam(cur, updated["syllabus_id"]), [question_id])
+            conn.commit()
+
+@router.get("/media/{name}")
+def get_media(name: str, if_none_match: Optional[str] = Header(None)):
+    """Serve a stored file; names are content hashes so responses never change"""
+    match = media.MEDIA_NAME.match(name)
+    if not match:
+        raise HTTPException(status_code=404, detail="Media not found")
+
+    path = media.path_for(name)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Media not found")
+
+    headers = {**media.CACHE_HEADERS, "ETag": media.etag_for(name)}
+    if media.etag_matches(if_none_match, name):
+        return Response(status_code=304, headers=headers)
+
+    media_type = media.MEDIA_TYPES[match.group("ext")]
+    if media.ACCEL_REDIRECT:
+        # The front proxy sends the file from disk with sendfile; the app only names it
+        return Response(media_type=media_type, headers={**headers, "X-Accel-Redirect": media.accel_path_for(name)})
+
+    # Without a proxy the file is read in chunks and passes through the app's
+    # http middlewares like any other body; there is no zero-copy path here
+    return FileResponse(path, media_type=media_type, headers=headers)
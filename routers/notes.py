@@ -2,29 +2,23 @@ from fastapi import APIRouter, HTTPException
 from typing import List
 import psycopg2
 from database import get_db
+import cache
+import repository
 from models import NoteCreate, NoteUpdate, NoteResponse
+from profiler import ProfiledRoute
 
-router = APIRouter(tags=["Notes"])
+router = APIRouter(tags=["Notes"], route_class=ProfiledRoute)
 
 @router.get("/exams/{exam_overview_id}/notes", response_model=List[NoteResponse])
 def get_all_notes(exam_overview_id: int):
     """Get all notes for an exam"""
-    with get_db() as conn:
+    with get_db(readonly=True) as conn:
         with conn.cursor() as cur:
-            # Check if exam exists
-            cur.execute("SELECT 1 FROM exam_overview WHERE exam_overview_id = %s", 
-                       (exam_overview_id,))
-            if not cur.fetchone():
+            notes = repository.list_notes(cur, exam_overview_id)
+
+            if notes is None:
                 raise HTTPException(status_code=404, detail="Exam not found")
-            
-            cur.execute("""
-                SELECT note_id, note, exam_overview_id
-                FROM notes
-                WHERE exam_overview_id = %s
-                ORDER BY note_id
-            """, (exam_overview_id,))
-            
-            notes = cur.fetchall()
+
             return notes
 
 @router.post("/exams/{exam_overview_id}/notes", response_model=NoteResponse, status_code=201)
@@ -33,43 +27,26 @@ def add_note(exam_overview_id: int, note: NoteCreate):
     with get_db() as conn:
         with conn.cursor() as cur:
             try:
-                cur.execute("""
-                    INSERT INTO notes (note, exam_overview_id)
-                    VALUES (%s, %s)
-                    RETURNING note_id, note, exam_overview_id
-                """, (note.note, exam_overview_id))
-                
-                new_note = cur.fetchone()
+                new_note = repository.create_note(cur, exam_overview_id, note)
+                cache.publish(cur, "notes", exam_overview_id)
                 conn.commit()
                 return new_note
-                
+
             except psycopg2.IntegrityError as e:
                 conn.rollback()
-                error_msg = str(e)
-                print(f"Database Error: {error_msg}")
-                
-                if "foreign key" in error_msg.lower():
-                    raise HTTPException(status_code=404, detail="Exam not found")
-                else:
-                    raise HTTPException(status_code=400, detail=f"Database constraint violation: {error_msg}")
+                raise repository.integrity_error(e)
 
 @router.put("/notes/{note_id}", response_model=NoteResponse)
 def update_note(note_id: int, note: NoteUpdate):
     """Update note"""
     with get_db() as conn:
         with conn.cursor() as cur:
-            cur.execute("""
-                UPDATE notes
-                SET note = %s
-                WHERE note_id = %s
-                RETURNING note_id, note, exam_overview_id
-            """, (note.note, note_id))
-            
-            updated_note = cur.fetchone()
-            
+            updated_note = repository.update_note(cur, note_id, {"note": note.note})
+
             if not updated_note:
                 raise HTTPException(status_code=404, detail="Note not found")
-            
+
+            cache.publish(cur, "notes", updated_note["exam_overview_id"])
             conn.commit()
             return updated_note
 
@@ -78,12 +55,10 @@ def delete_note(note_id: int):
     """Delete note"""
     with get_db() as conn:
         with conn.cursor() as cur:
-            cur.execute("""
-                DELETE FROM notes
-                WHERE note_id = %s
-            """, (note_id,))
-            
-            if cur.rowcount == 0:
+            deleted = repository.delete_note(cur, note_id)
+
+            if not deleted:
                 raise HTTPException(status_code=404, detail="Note not found")
-            
+
+            cache.publish(cur, "notes", deleted["exam_overview_id"])
             conn.commit()
\ No newline at end of file
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import List
+import cache
+import mastery
+from models import PracticeSubmission, PracticeSubmissionResponse, TopicMastery
+from profiler import ProfiledRoute
+
+router = APIRouter(tags=["Practice"], route_class=ProfiledRoute)
+
+@router.post("/users/{user_id}/exams/{exam_overview_id}/answers", response_model=PracticeSubmissionResponse)
+def submit_practice_answers(user_id: int, exam_overview_id: int, submission: PracticeSubmission):
+    """Grade practice answers and add them to the user's topic stats"""
+    answer_key = cache.answer_key(exam_overview_id)
+
+    unknown = [a.question_id for a in submission.answers if a.question_id not in answer_key]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Questions not found in this exam: {unknown}")
+
+    results = []
+    for answer in submission.answers:
+        question = answer_key[answer.question_id]
+        correct = answer.selected_option.strip().upper() == question["correct_option"].strip().upper()
+        mastery.buffer.record(user_id, question["syllabus_id"], question["difficulty"], correct)
+        results.append({
+            "question_id": answer.question_id,
+            "correct": correct,
+            "correct_option": question["correct_option"],
+        })
+
+    return {
+        "recorded": len(results),
+        "correct": sum(r["correct"] for r in results),
+        "results": results,
+    }
+
+@router.get("/users/{user_id}/exams/{exam_overview_id}/weak-topics", response_model=List[TopicMastery])
+def get_weak_topics(user_id: int, exam_overview_id: int, limit: int = Query(5, ge=1, le=100)):
+    """Topics to practise next, weakest accuracy first"""
+    return mastery.recommend(user_id, exam_overview_id, limit)
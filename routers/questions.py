@@ -1,10 +1,16 @@
-from fastapi import APIRouter, HTTPException, Query, UploadFile, File
+from fastapi import APIRouter, HTTPException, Query, Response, UploadFile, File
 from typing import List, Optional
 import psycopg2
 from database import get_db
-from models import QuestionCreate, QuestionUpdate, QuestionResponse
+import cache
+import dedup
+import jobs
+import repository
+from models import (QuestionCreate, QuestionUpdate, QuestionResponse, ArchivedQuestionResponse, JobResponse,
+                    BulkUploadRequest, BulkUploadResponse, DuplicateCluster, ArchiveQuestionsPayload)
+from profiler import ProfiledRoute
 
-router = APIRouter(tags=["Questions"])
+router = APIRouter(tags=["Questions"], route_class=ProfiledRoute)
 
 @router.get("/questions", response_model=List[QuestionResponse])
 def get_all_questions(
@@ -12,106 +18,145 @@ def get_all_questions(
     difficulty: Optional[str] = Query(None)
 ):
     """Get all questions (filters optional)"""
-    with get_db() as conn:
+    with get_db(readonly=True) as conn:
         with conn.cursor() as cur:
-            query = """
-                SELECT question_id, syllabus_id, difficulty, question_text,
-                       option_a, option_b, option_c, option_d, correct_option,
-                       solution, is_active, created_at, updated_at
-                FROM questions
-                WHERE is_active = TRUE
-            """
-            params = []
-            
-            if syllabus_id:
-                query += " AND syllabus_id = %s"
-                params.append(syllabus_id)
-            
-            if difficulty:
-                query += " AND difficulty = %s"
-                params.append(difficulty)
-            
-            query += " ORDER BY question_id"
-            
-            cur.execute(query, params)
-            questions = cur.fetchall()
-            return questions
+            return repository.list_questions(cur, syllabus_id, difficulty)
 
 @router.get("/syllabus/{syllabus_id}/questions", response_model=List[QuestionResponse])
 def get_questions_for_topic(syllabus_id: int):
     """Get all questions for one topic"""
-    with get_db() as conn:
+    with get_db(readonly=True) as conn:
         with conn.cursor() as cur:
-            cur.execute("SELECT 1 FROM syllabus WHERE syllabus_id = %s", (syllabus_id,))
-            if not cur.fetchone():
+            questions = repository.list_topic_questions(cur, syllabus_id)
+
+            if questions is None:
                 raise HTTPException(status_code=404, detail="Syllabus topic not found")
-            
-            cur.execute("""
-                SELECT question_id, syllabus_id, difficulty, question_text,
-                       option_a, option_b, option_c, option_d, correct_option,
-                       solution, is_active, created_at, updated_at
-                FROM questions
-                WHERE syllabus_id = %s AND is_active = TRUE
-                ORDER BY question_id
-            """, (syllabus_id,))
-            
-            questions = cur.fetchall()
+
             return questions
 
+def _duplicate_ids(matches):
+    return ",".join(str(m["question_id"]) for m in matches)
+
 @router.post("/syllabus/{syllabus_id}/questions", response_model=QuestionResponse, status_code=201)
-def add_question(syllabus_id: int, question: QuestionCreate):
-    """Add a new question"""
+def add_question(
+    syllabus_id: int,
+    question: QuestionCreate,
+    response: Response,
+    allow_duplicates: bool = Query(False)
+):
+    """Add a new question; near-duplicates within the exam are rejected unless allowed"""
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            exam_overview_id = repository.get_topic_exam(cur, syllabus_id)
+
+            if exam_overview_id is None:
+                raise HTTPException(status_code=404, detail="Syllabus topic not found")
+
+            index = dedup.index_for(cur, exam_overview_id)
+            signature = dedup.signature(question)
+            matches = index.matches(signature)
+
+            if matches and not allow_duplicates:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Near-duplicate of question(s) {_duplicate_ids(matches)} in this exam, "
+                           f"pass allow_duplicates=true to add it anyway",
+                    headers={"X-Near-Duplicates": _duplicate_ids(matches)}
+                )
+
+            try:
+                new_question = repository.create_question(cur, syllabus_id, question, signature)
+                change = cache.publish(cur, "questions", exam_overview_id, [new_question["question_id"]])
+                conn.commit()
+
+            except psycopg2.IntegrityError as e:
+                conn.rollback()
+                raise repository.integrity_error(e)
+
+            index.add(new_question["question_id"], syllabus_id, signature, change)
+            if matches:
+                response.headers["X-Near-Duplicates"] = _duplicate_ids(matches)
+            return new_question
+
+@router.post("/syllabus/{syllabus_id}/questions/bulk", response_model=BulkUploadResponse, status_code=201)
+def bulk_add_questions(
+    syllabus_id: int,
+    upload: BulkUploadRequest,
+    allow_duplicates: bool = Query(False)
+):
+    """Add many questions to a topic in one transaction.
+
+    Near-duplicates of existing questions, or of earlier entries in the same
+    upload, are skipped unless allowed; either way they are reported by index.
+    """
     with get_db() as conn:
         with conn.cursor() as cur:
+            exam_overview_id = repository.get_topic_exam(cur, syllabus_id)
+
+            if exam_overview_id is None:
+                raise HTTPException(status_code=404, detail="Syllabus topic not found")
+
+            index = dedup.index_for(cur, exam_overview_id)
+            batch = dedup.ExamIndex(exam_overview_id)  # entries of this upload, keyed by -(position + 1)
+            accepted, signatures, duplicates = [], [], []
+
+            for position, question in enumerate(upload.questions):
+                signature = dedup.signature(question)
+                matches = index.matches(signature) + batch.matches(signature)
+                inserted = allow_duplicates or not matches
+                if matches:
+                    duplicates.append({"index": position, "inserted": inserted, "matches": matches})
+                if inserted:
+                    batch.add(-(len(accepted) + 1), syllabus_id, signature)
+                    accepted.append(question)
+                    signatures.append(signature)
+
             try:
-                cur.execute("""
-                    INSERT INTO questions 
-                    (syllabus_id, difficulty, question_text, option_a, option_b,
-                     option_c, option_d, correct_option, solution)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING question_id, syllabus_id, difficulty, question_text,
-                              option_a, option_b, option_c, option_d, correct_option,
-                              solution, is_active, created_at, updated_at
-                """, (syllabus_id, question.difficulty, question.question_text,
-                      question.option_a, question.option_b, question.option_c,
-                      question.option_d, question.correct_option, question.solution))
-                
-                new_question = cur.fetchone()
+                created = repository.create_questions(cur, syllabus_id, accepted, signatures) if accepted else []
+                change = cache.publish(cur, "questions", exam_overview_id, [row["question_id"] for row in created])
                 conn.commit()
-                return new_question
-                
+
             except psycopg2.IntegrityError as e:
                 conn.rollback()
-                error_msg = str(e)
-                print(f"Database Error: {error_msg}")
-                
-                if "foreign key" in error_msg.lower():
-                    raise HTTPException(status_code=404, detail="Syllabus topic not found")
-                else:
-                    raise HTTPException(status_code=400, detail=f"Database constraint violation: {error_msg}")
+                raise repository.integrity_error(e)
+
+            # Point matches against earlier entries of the upload at their new ids
+            for duplicate in duplicates:
+                for match in duplicate["matches"]:
+                    if match["question_id"] < 0:
+                        match["question_id"] = created[-match["question_id"] - 1]["question_id"]
+
+            for row, signature in zip(created, signatures):
+                index.add(row["question_id"], syllabus_id, signature, change)
+            return {"created": created, "duplicates": duplicates}
+
+@router.get("/exams/{exam_overview_id}/questions/duplicates", response_model=List[DuplicateCluster])
+def get_duplicate_questions(exam_overview_id: int):
+    """Clusters of near-duplicate active questions within an exam, largest first"""
+    # Primary, so the index never syncs from a lagging replica and misses new questions
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            if not repository.exam_exists(cur, exam_overview_id):
+                raise HTTPException(status_code=404, detail="Exam not found")
+
+            return dedup.index_for(cur, exam_overview_id).clusters()
 
 @router.put("/questions/{question_id}", response_model=QuestionResponse)
 def update_question(question_id: int, question: QuestionUpdate):
     """Update question or solution"""
     with get_db() as conn:
         with conn.cursor() as cur:
-            if question.solution is None:
+            fields = question.model_dump(exclude_none=True)
+
+            if not fields:
                 raise HTTPException(status_code=400, detail="No fields to update")
-            
-            cur.execute("""
-                UPDATE questions
-                SET solution = %s, updated_at = NOW()
-                WHERE question_id = %s
-                RETURNING question_id, syllabus_id, difficulty, question_text,
-                          option_a, option_b, option_c, option_d, correct_option,
-                          solution, is_active, created_at, updated_at
-            """, (question.solution, question_id))
-            
-            updated_question = cur.fetchone()
-            
+
+            updated_question = repository.update_question(cur, question_id, fields)
+
             if not updated_question:
                 raise HTTPException(status_code=404, detail="Question not found")
-            
+
+            cache.publish(cur, "questions", repository.get_topic_exam(cur, updated_question["syllabus_id"]), [question_id])
             conn.commit()
             return updated_question
 
@@ -120,15 +165,73 @@ def delete_question(question_id: int):
     """Delete question"""
     with get_db() as conn:
         with conn.cursor() as cur:
-            cur.execute("""
-                DELETE FROM questions
-                WHERE question_id = %s
-            """, (question_id,))
-            
-            if cur.rowcount == 0:
+            deleted = repository.delete_question(cur, question_id)
+
+            if not deleted:
                 raise HTTPException(status_code=404, detail="Question not found")
-            
+
+            cache.publish(cur, "questions", repository.get_topic_exam(cur, deleted["syllabus_id"]), [question_id])
+            conn.commit()
+
+@router.post("/questions/archive", response_model=JobResponse, status_code=202)
+def archive_inactive_questions(
+    exam_overview_id: Optional[int] = Query(None),
+    older_than_days: int = Query(0, ge=0)
+):
+    """Move inactive questions out of the hot table into questions_archive in a background job"""
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            job = jobs.enqueue(cur, "archive_questions", {
+                "exam_overview_id": exam_overview_id,
+                "older_than_days": older_than_days,
+            })
+            conn.commit()
+            jobs.wake()
+            return job
+
+@jobs.handler("archive_questions", ArchiveQuestionsPayload)
+def run_archive_questions(job):
+    archived = 0
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            # Commit per batch so row locks are held briefly
+            while True:
+                moved = repository.archive_questions(
+                    cur, job.payload["exam_overview_id"], job.payload["older_than_days"])
+                conn.commit()
+                if moved == 0:
+                    break
+                archived += moved
+                job.report(0, f"Archived {archived} questions")
+    return {"archived": archived}
+
+@router.get("/questions/archived", response_model=List[ArchivedQuestionResponse])
+def get_archived_questions(
+    syllabus_id: Optional[int] = Query(None),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """List archived questions"""
+    with get_db(readonly=True) as conn:
+        with conn.cursor() as cur:
+            return repository.list_archived_questions(cur, syllabus_id, limit)
+
+@router.post("/questions/{question_id}/restore", response_model=QuestionResponse)
+def restore_question(question_id: int):
+    """Move an archived question back and reactivate it"""
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            try:
+                restored = repository.restore_question(cur, question_id)
+            except psycopg2.IntegrityError as e:
+                conn.rollback()
+                raise repository.integrity_error(e)
+
+            if not restored:
+                raise HTTPException(status_code=404, detail="Archived question not found")
+
+            cache.publish(cur, "questions", repository.get_topic_exam(cur, restored["syllabus_id"]), [question_id])
             conn.commit()
+            return restored
 
 # @router.post("/questions/generate", status_code=201)
 # def auto_generate_questions(request: AIGenerateRequest):
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Query, Request
+from profiler import ProfiledRoute, run_in_threadpool
+from typing import Optional
+import roster
+from models import RosterImportResponse
+
+router = APIRouter(tags=["Roster"], route_class=ProfiledRoute)
+
+# The roster is the raw CSV request body with a header row, e.g.
+# curl --data-binary @grade7.csv -H "Content-Type: text/csv" "/users/roster?school_name=..."
+
+@router.post("/users/roster", response_model=RosterImportResponse)
+async def import_roster(
+    request: Request,
+    school_name: Optional[str] = Query(None, max_length=255),
+    city: Optional[str] = Query(None, max_length=100),
+    state: Optional[str] = Query(None, max_length=100)
+):
+    """Create student accounts from a CSV roster; school_name, city and state fill blank cells"""
+    upload = await roster.spool_upload(request)
+    try:
+        defaults = {"school_name": school_name, "city": city, "state": state}
+        return await run_in_threadpool(roster.import_roster, upload, defaults)
+    finally:
+        upload.close()
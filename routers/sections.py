@@ -2,30 +2,28 @@ from fastapi import APIRouter, HTTPException
 from typing import List
 import psycopg2
 from database import get_db
+import cache
+import repository
+from singleflight import reads
 from models import SectionCreate, SectionUpdate, SectionResponse
+from profiler import ProfiledRoute
 
-router = APIRouter(tags=["Sections"])
+router = APIRouter(tags=["Sections"], route_class=ProfiledRoute)
 
 @router.get("/exams/{exam_overview_id}/sections", response_model=List[SectionResponse])
-def get_all_sections(exam_overview_id: int):
+async def get_all_sections(exam_overview_id: int):
     """Get all sections for an exam"""
-    with get_db() as conn:
+    sections = await reads.do(("sections", exam_overview_id), lambda: _load_sections(exam_overview_id))
+
+    if sections is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    return sections
+
+def _load_sections(exam_overview_id):
+    with get_db(readonly=True) as conn:
         with conn.cursor() as cur:
-            cur.execute("SELECT 1 FROM exam_overview WHERE exam_overview_id = %s", 
-                       (exam_overview_id,))
-            if not cur.fetchone():
-                raise HTTPException(status_code=404, detail="Exam not found")
-            
-            cur.execute("""
-                SELECT section_id, exam_overview_id, section, 
-                       no_of_questions, marks_per_question, total_marks
-                FROM sections
-                WHERE exam_overview_id = %s
-                ORDER BY section_id
-            """, (exam_overview_id,))
-            
-            sections = cur.fetchall()
-            return sections
+            return repository.list_sections(cur, exam_overview_id)
 
 @router.post("/exams/{exam_overview_id}/sections", response_model=SectionResponse, status_code=201)
 def add_section(exam_overview_id: int, section: SectionCreate):
@@ -33,88 +31,35 @@ def add_section(exam_overview_id: int, section: SectionCreate):
     with get_db() as conn:
         with conn.cursor() as cur:
             try:
-                cur.execute("""
-                    INSERT INTO sections 
-                    (exam_overview_id, section, no_of_questions, 
-                     marks_per_question, total_marks)
-                    VALUES (%s, %s, %s, %s, %s)
-                    RETURNING section_id, exam_overview_id, section, 
-                              no_of_questions, marks_per_question, total_marks
-                """, (exam_overview_id, section.section, section.no_of_questions,
-                      section.marks_per_question, section.total_marks))
-                
-                new_section = cur.fetchone()
+                new_section = repository.create_section(cur, exam_overview_id, section)
+                cache.publish(cur, "sections", exam_overview_id)
                 conn.commit()
                 return new_section
-                
+
             except psycopg2.IntegrityError as e:
                 conn.rollback()
-                error_msg = str(e)
-                print(f"Database Error: {error_msg}")
-                
-                # Check specific error types
-                if "foreign key" in error_msg.lower():
-                    raise HTTPException(
-                        status_code=404, 
-                        detail=f"Exam not found with id {exam_overview_id}"
-                    )
-                elif "unique constraint" in error_msg.lower():
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"Section already exists or duplicate: {error_msg}"
-                    )
-                elif "check constraint" in error_msg.lower():
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"Validation failed: {error_msg}"
-                    )
-                else:
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"Database constraint violation: {error_msg}"
-                    )
-            except Exception as e:
-                conn.rollback()
-                print(f"Unexpected Error: {str(e)}")
-                raise HTTPException(
-                    status_code=500, 
-                    detail=f"Internal server error: {str(e)}"
-                )
+                raise repository.integrity_error(e)
 
 @router.put("/sections/{section_id}", response_model=SectionResponse)
 def update_section(section_id: int, section: SectionUpdate):
     """Update section details"""
     with get_db() as conn:
         with conn.cursor() as cur:
-            updates = []
-            values = []
-            
-            if section.no_of_questions is not None:
-                updates.append("no_of_questions = %s")
-                values.append(section.no_of_questions)
-            
-            if section.total_marks is not None:
-                updates.append("total_marks = %s")
-                values.append(section.total_marks)
-            
-            if not updates:
+            fields = section.model_dump(exclude_none=True)
+
+            if not fields:
                 raise HTTPException(status_code=400, detail="No fields to update")
-            
-            values.append(section_id)
-            
-            cur.execute(f"""
-                UPDATE sections
-                SET {', '.join(updates)}
-                WHERE section_id = %s
-                RETURNING section_id, exam_overview_id, section, 
-                          no_of_questions, marks_per_question, total_marks
-            """, values)
-            
-            updated_section = cur.fetchone()
-            
+
+            try:
+                updated_section = repository.update_section(cur, section_id, fields)
+            except psycopg2.IntegrityError as e:
+                conn.rollback()
+                raise repository.integrity_error(e)
+
             if not updated_section:
                 raise HTTPException(status_code=404, detail="Section not found")
-            
+
+            cache.publish(cur, "sections", updated_section["exam_overview_id"])
             conn.commit()
             return updated_section
 
@@ -123,12 +68,10 @@ def delete_section(section_id: int):
     """Delete section (cascade to syllabus)"""
     with get_db() as conn:
         with conn.cursor() as cur:
-            cur.execute("""
-                DELETE FROM sections
-                WHERE section_id = %s
-            """, (section_id,))
-            
-            if cur.rowcount == 0:
+            deleted = repository.delete_section(cur, section_id)
+
+            if not deleted:
                 raise HTTPException(status_code=404, detail="Section not found")
-            
+
+            cache.publish(cur, "sections", deleted["exam_overview_id"])
             conn.commit()
\ No newline at end of file
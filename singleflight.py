@@ -0,0 +1,73 @@
+import asyncio
+import os
+from fastapi import HTTPException
+import database
+from profiler import run_in_threadpool
+
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT_SECS", "10"))
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+
+    The first caller (the leader) runs the blocking function in the threadpool;
+    callers arriving while it is in flight await its result or exception on the
+    event loop, so hundreds of followers hold no threadpool thread. Used from
+    the event loop only.
+
+    Callers for whom bypass() is true run the function themselves, e.g. clients
+    whose last write a replica read could still miss.
+    """
+
+    def __init__(self, timeout=SINGLEFLIGHT_TIMEOUT, bypass=None):
+        self.timeout = timeout
+        self.bypass = bypass
+        self._calls = {}
+        self._stats = {"leaders": 0, "collapsed": 0, "bypassed": 0, "errors": 0, "timeouts": 0}
+
+    async def do(self, key, fn, timeout=None):
+        if self.bypass is not None and self.bypass():
+            self._stats["bypassed"] += 1
+            return await run_in_threadpool(fn)
+
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = asyncio.get_running_loop().create_future()
+            self._stats["leaders"] += 1
+            try:
+                result = await run_in_threadpool(fn)
+            except BaseException as e:
+                self._stats["errors"] += 1
+                if not isinstance(e, Exception):
+                    # The leader was cancelled; followers get an error of their own
+                    e = HTTPException(status_code=503, detail="Identical request was cancelled, try again")
+                call.set_exception(e)
+                raise
+            else:
+                call.set_result(result)
+            finally:
+                del self._calls[key]
+                # Mark the exception retrieved when nobody followed
+                if call.done() and not call.cancelled():
+                    call.exception()
+            return result
+
+        self._stats["collapsed"] += 1
+        try:
+            # Shielded so a follower timing out doesn't cancel the shared result
+            return await asyncio.wait_for(asyncio.shield(call), self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise HTTPException(status_code=504, detail="Timed out waiting for an identical request")
+
+    def in_flight(self, key):
+        """Whether a call with this key is running, so a new caller would only wait for it"""
+        return key in self._calls
+
+    def stats(self):
+        return {**self._stats, "in_flight": len(self._calls)}
+
+
+# Shared by the hot exam read endpoints. A leader's replica read can predate a
+# follower's own write, so clients with a write not replayed everywhere don't share results.
+reads = SingleFlight(bypass=database.is_pinned)
@@ -0,0 +1,122 @@
+import collections
+import contextvars
+import os
+import random
+import re
+import threading
+import time
+import statements
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))                 # statements slower than this are logged
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))       # entries kept per process
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1"))  # share of slow SELECTs re-run under EXPLAIN
+MAX_STATEMENT_CHARS = 2000
+
+# Literals in a statement's text; execute_values inlines a batch's values this way
+_STRING_LITERAL = re.compile(r"\b[Ee]'(?:[^'\\]|''|\\.)*'|'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.$])\d+(?:\.\d+)?(?![\w.])")
+_VALUES_LIST = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_WRITE = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+# What the current statement is running for: "METHOD /path" per request, "job <kind>" in workers
+_route = contextvars.ContextVar("slowlog_route", default=None)
+
+_entries = collections.deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_lock = threading.Lock()
+_stats = {"logged": 0, "explained": 0, "explain_errors": 0}
+
+
+def bind_route(route):
+    return _route.set(route)
+
+
+def unbind_route(token):
+    _route.reset(token)
+
+
+def param_shape(params):
+    """Types of the parameters, never their values, so nothing personal ends up in the log"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+
+def redact(statement):
+    """The statement with its string and number literals replaced by ?"""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    return _VALUES_LIST.sub(r"\1, ...", statement)
+
+
+def redact_plan(plan):
+    """The plan with the string literals of its conditions replaced by ?; costs and timings stay"""
+    return _STRING_LITERAL.sub("?", plan)
+
+
+def _is_select(statement):
+    words = statement.split(None, 2)
+    if not words:
+        return False
+    if words[0].upper() == "EXECUTE" and len(words) > 1:
+        # Prepared statements from statements.py, explained through their definition
+        _, sql = statements.STATEMENTS.get(words[1].split("(")[0], (None, ""))
+        return _is_select(sql)
+    if words[0].upper() == "WITH":
+        # Reads only when none of its queries is data-modifying
+        return not _WRITE.search(_STRING_LITERAL.sub("?", statement))
+    return words[0].upper() == "SELECT"
+
+
+def should_explain(statement):
+    # EXPLAIN ANALYZE runs the statement again, so only plain SELECTs qualify
+    return (SLOW_QUERY_EXPLAIN_RATE > 0
+            and _is_select(statement)
+            and random.random() < SLOW_QUERY_EXPLAIN_RATE)
+
+
+def record(statement, params, duration_ms, plan=None):
+    entry = {
+        "at": time.time(),
+        "route": _route.get(),
+        "duration_ms": round(duration_ms, 2),
+        "statement": " ".join(redact(statement).split())[:MAX_STATEMENT_CHARS],
+        "params": param_shape(params),
+        "plan": redact_plan(plan) if plan is not None else None,
+    }
+    with _lock:
+        _entries.append(entry)
+        _stats["logged"] += 1
+        if plan is not None:
+            _stats["explained"] += 1
+    print(f"Slow query ({entry['duration_ms']} ms) on {entry['route']}: {entry['statement'][:200]}")
+
+
+def note_explain_error(e):
+    with _lock:
+        _stats["explain_errors"] += 1
+    print(f"Slow query EXPLAIN failed: {str(e)}")
+
+
+def entries(limit=None):
+    """Logged statements, newest first"""
+    with _lock:
+        recent = list(_entries)
+    recent.reverse()
+    return recent[:limit] if limit else recent
+
+
+def stats():
+    with _lock:
+        return {
+            **_stats,
+            "kept": len(_entries),
+            "threshold_ms": SLOW_QUERY_MS,
+            "explain_rate": SLOW_QUERY_EXPLAIN_RATE,
+        }
+
+
+def clear():
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,61 @@
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+# Hot queries prepared once per pooled connection and executed by name.
+# Each entry is (argument types, SQL using $n placeholders); see repository.py.
+STATEMENTS = {}
+
+
+def register(name, argtypes, sql):
+    STATEMENTS[name] = (argtypes, sql)
+
+
+def _is_stale(e):
+    """True when the server no longer has a usable copy of the statement"""
+    if isinstance(e, psycopg2.errors.InvalidSqlStatementName):
+        return True  # dropped by DISCARD ALL or a pooler handing us another backend
+    return isinstance(e, psycopg2.errors.FeatureNotSupported) and "cached plan" in str(e)
+
+
+def _prepare(cur, name):
+    argtypes, sql = STATEMENTS[name]
+    cur.execute(f"PREPARE {name} ({argtypes}) AS {sql}")
+    cur.connection.prepared.add(name)
+
+
+def prepare_all(cur):
+    """Prepare every registered statement this connection doesn't have yet"""
+    for name in STATEMENTS:
+        if name not in cur.connection.prepared:
+            _prepare(cur, name)
+
+
+def execute(cur, name, params=()):
+    """Execute a registered statement, preparing it on first use per connection"""
+    conn = cur.connection
+    placeholders = ", ".join(["%s"] * len(params))
+    # A failed statement aborts the transaction, so only retry when nothing
+    # else has run in it yet
+    can_retry = conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    try:
+        if name not in conn.prepared:
+            _prepare(cur, name)
+        cur.execute(f"EXECUTE {name} ({placeholders})", params)
+        return cur
+    except psycopg2.Error as e:
+        if not (can_retry and _is_stale(e)):
+            raise
+        print(f"Re-preparing statement {name}: {str(e)}")
+
+    # Prepared statements survive a rollback, so resync with what the server holds
+    conn.rollback()
+    cur.execute("SELECT name FROM pg_prepared_statements")
+    conn.prepared = {row["name"] for row in cur.fetchall()}
+    if name in conn.prepared:
+        cur.execute(f"DEALLOCATE {name}")
+        conn.prepared.discard(name)
+    _prepare(cur, name)
+    cur.execute(f"EXECUTE {name} ({placeholders})", params)
+    return cur
@@ -0,0 +1,102 @@
+import copy
+import os
+import sys
+import types
+
+import psycopg2.extensions
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache
+import database
+import main
+import statements
+from fastapi.testclient import TestClient
+
+
+class FakeDatabase:
+    """Stands in for the connection pools and records every statement sent.
+
+    Each statement gets a fresh copy of rows as its result set.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.rows = []
+
+
+class CountingCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = -1
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, vars=None):
+        self.connection.db.statements.append(query)
+        self._rows = copy.deepcopy(self.connection.db.rows)
+        self.rowcount = len(self._rows)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeConnection:
+    closed = 0
+
+    def __init__(self, db):
+        self.db = db
+        # A warmed-up pooled connection has every hot statement prepared already
+        self.prepared = set(statements.STATEMENTS)
+        self.info = types.SimpleNamespace(transaction_status=psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def cursor(self):
+        return CountingCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    name = "fake"
+    healthy = True
+
+    def __init__(self, db):
+        self.db = db
+
+    def getconn(self):
+        return FakeConnection(self.db)
+
+    def putconn(self, conn):
+        pass
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(database, "primary", FakePool(fake))
+    monkeypatch.setattr(database, "replicas", [])
+    cache.flush_all()
+    yield fake
+    cache.flush_all()
+
+
+@pytest.fixture
+def client(request):
+    # Lifespan not started: nothing connects to a real database
+    client = TestClient(main.app)
+    # Own rate-limit bucket per test
+    client.headers["X-Client-Id"] = request.node.name
+    return client
@@ -0,0 +1,143 @@
+"""Replica routing, against a real primary and replica (see docker-compose.replicas.yml)
+where the servers fixture is used.
+
+Those tests are skipped unless DB_REPLICA_HOSTS is set and both servers answer.
+"""
+import time
+
+import psycopg2
+import pytest
+
+import database
+from conftest import FakeConnection
+
+
+def _in_recovery(readonly):
+    with database.get_db(readonly=readonly) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_is_in_recovery() AS standby")
+            standby = cur.fetchone()["standby"]
+        conn.rollback()
+    return standby
+
+
+@pytest.fixture
+def servers():
+    if not database.replicas:
+        pytest.skip("DB_REPLICA_HOSTS not set")
+    for pool in [database.primary, *database.replicas]:
+        try:
+            pool.putconn(pool.getconn())
+        except psycopg2.OperationalError as e:
+            pytest.skip(f"{pool.name} unreachable: {str(e)}")
+
+
+class FakeReplica:
+    name = "fake-replica"
+    healthy = True
+
+    def __init__(self, lsn):
+        self.replay_lsn = database.parse_lsn(lsn)
+
+
+def test_reads_after_a_write_go_to_replicas_that_replayed_it(monkeypatch):
+    behind, ahead = FakeReplica("0/100"), FakeReplica("0/300")
+    monkeypatch.setattr(database, "replicas", [behind, ahead])
+    monkeypatch.setattr(database, "_monitor", "running")
+
+    token = database.bind_request("0/200")
+    try:
+        assert {database._choose_pool(readonly=True) for _ in range(20)} == {ahead}
+        assert database.is_pinned()
+    finally:
+        database.unbind_request(token)
+
+    token = database.bind_request("0/400")
+    try:
+        assert database._choose_pool(readonly=True) is database.primary
+    finally:
+        database.unbind_request(token)
+
+    # Clients that haven't written, or send something that isn't an LSN, may read anywhere
+    for read_after in (None, "not-an-lsn"):
+        token = database.bind_request(read_after)
+        try:
+            assert {database._choose_pool(readonly=True) for _ in range(40)} == {behind, ahead}
+            assert not database.is_pinned()
+        finally:
+            database.unbind_request(token)
+
+
+def test_write_answers_with_its_commit_position(client, db, monkeypatch):
+    monkeypatch.setattr(FakeConnection, "commit", lambda self: database._note_commit("16/B374D848"))
+    db.rows = [{"job_id": 1, "kind": "delete_exam", "payload": {"exam_overview_id": 1}, "status": "queued",
+                "progress": 0, "message": None, "attempts": 0, "max_attempts": 3, "result": None,
+                "created_at": "2024-06-01T00:00:00Z", "updated_at": "2024-06-01T00:00:00Z"}]
+
+    response = client.delete("/exams/1")
+
+    assert response.status_code == 202, response.text
+    assert response.headers["X-Read-After"] == "16/B374D848"
+    assert "X-Read-After" not in client.get("/jobs/1").headers
+
+
+def test_reads_go_to_a_replica_and_writes_to_the_primary(servers):
+    token = database.bind_request()
+    try:
+        assert _in_recovery(readonly=True) is True
+        assert _in_recovery(readonly=False) is False
+    finally:
+        database.unbind_request(token)
+
+
+def test_read_only_commit_records_no_position(servers):
+    token = database.bind_request()
+    try:
+        with database.get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.commit()
+        assert database.committed_lsn() is None
+    finally:
+        database.unbind_request(token)
+
+
+def test_client_reads_its_own_writes(servers):
+    token = database.bind_request()
+    try:
+        with database.get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT txid_current()")  # assigns a transaction id, so the commit is a write
+            conn.commit()
+        lsn = database.committed_lsn()
+        assert lsn
+    finally:
+        database.unbind_request(token)
+
+    # A position no replica has replayed yet is read from the primary
+    token = database.bind_request("FFFFFFFF/FFFFFFFF")
+    try:
+        assert _in_recovery(readonly=True) is False
+    finally:
+        database.unbind_request(token)
+
+    # and the client's own write from the replica once it has replayed it
+    replica = database.replicas[0]
+    deadline = time.monotonic() + 5
+    while replica.replay_lsn < database.parse_lsn(lsn) and time.monotonic() < deadline:
+        time.sleep(0.05)
+        database._check_replica(replica)
+    token = database.bind_request(lsn)
+    try:
+        assert _in_recovery(readonly=True) is True
+    finally:
+        database.unbind_request(token)
+
+
+def test_replica_health_check_measures_lag(servers):
+    replica = database.replicas[0]
+
+    database._check_replica(replica)
+
+    assert replica.healthy
+    assert 0 <= replica.lag <= database.REPLICA_MAX_LAG
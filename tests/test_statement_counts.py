@@ -0,0 +1,80 @@
+"""Every read endpoint answers with a single statement, found or not."""
+from datetime import datetime, timezone
+
+import pytest
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+EXAM = {"exam_overview_id": 1, "exam": "Math Olympiad", "grade": 8, "level": 1,
+        "total_questions": 10, "total_marks": 40, "total_time_mins": 60}
+SECTION = {"section_id": 1, "exam_overview_id": 1, "section": "Algebra",
+           "no_of_questions": 10, "marks_per_question": 4, "total_marks": 40}
+SYLLABUS = {"syllabus_id": 1, "exam_overview_id": 1, "section_id": 1, "topic": "Equations", "subtopic": ""}
+NOTE = {"note_id": 1, "note": "Bring a pencil", "exam_overview_id": 1}
+QUESTION = {"question_id": 1, "syllabus_id": 1, "difficulty": "easy", "question_text": "2 + 2?",
+            "option_a": "3", "option_b": "4", "option_c": "5", "option_d": "6", "correct_option": "B",
+            "solution": "", "figure": None, "is_active": True, "created_at": NOW, "updated_at": NOW}
+OVERVIEW = {"exam": EXAM, "sections": [], "notes": []}
+ANALYTICS = {"exam_overview_id": 1, "total_topics": 1, "questions_by_difficulty": []}
+TOPIC = {"syllabus_id": 1, "section_id": 1, "section": "Algebra", "topic": "Equations", "subtopic": "",
+         "by_difficulty": {}}
+JOB = {"job_id": 1, "kind": "delete_exam", "payload": {"exam_overview_id": 1}, "status": "queued",
+       "progress": 0, "message": None, "attempts": 0, "max_attempts": 3, "result": None,
+       "created_at": NOW, "updated_at": NOW}
+
+READS = [
+    ("/exams", EXAM),
+    ("/exams/1", EXAM),
+    ("/exams/1/sections", SECTION),
+    ("/sections/1/syllabus", SYLLABUS),
+    ("/exams/1/notes", NOTE),
+    ("/questions", QUESTION),
+    ("/questions?syllabus_id=1&difficulty=easy", QUESTION),
+    ("/syllabus/1/questions", QUESTION),
+    ("/questions/archived", {**QUESTION, "is_active": False, "archived_at": NOW}),
+    ("/exams/1/overview", OVERVIEW),
+    ("/analytics/exam/1", ANALYTICS),
+    ("/users/1/exams/1/weak-topics", TOPIC),
+    ("/jobs/1", JOB),
+]
+
+# Reads of one record or of a parent's children tell a missing parent apart
+# from an empty one in that same statement
+MISSING = [
+    "/exams/1",
+    "/exams/1/sections",
+    "/sections/1/syllabus",
+    "/exams/1/notes",
+    "/syllabus/1/questions",
+    "/exams/1/overview",
+    "/analytics/exam/1",
+    "/jobs/1",
+]
+
+
+@pytest.mark.parametrize("path, row", READS)
+def test_read_is_one_statement(client, db, path, row):
+    db.rows = [row]
+
+    response = client.get(path)
+
+    assert response.status_code == 200, response.text
+    assert len(db.statements) == 1, db.statements
+
+
+@pytest.mark.parametrize("path", MISSING)
+def test_missing_read_is_one_statement(client, db, path):
+    response = client.get(path)
+
+    assert response.status_code == 404, response.text
+    assert len(db.statements) == 1, db.statements
+
+
+def test_cached_exam_list_needs_no_statement(client, db):
+    db.rows = [EXAM]
+    client.get("/exams")
+
+    response = client.get("/exams")
+
+    assert response.status_code == 200
+    assert len(db.statements) == 1
@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+import database
+import cache
+import statements
+
+WARMUP_RETRY_SECS = float(os.getenv("WARMUP_RETRY_SECS", "5"))
+WARMUP_EXAMS = int(os.getenv("WARMUP_EXAMS", "50"))  # answer keys preloaded at most
+
+# Boot timings in seconds, reported by /health/ready
+STARTUP = {
+    "ready": False,
+    "import_secs": None,
+    "warmup_secs": None,
+    "first_response_secs": None,
+    "error": None,
+}
+
+_process_started = None
+
+
+def mark_process_start(started):
+    global _process_started
+    _process_started = started
+
+
+def mark_imported():
+    STARTUP["import_secs"] = round(time.perf_counter() - _process_started, 3)
+
+
+def mark_first_response():
+    if STARTUP["first_response_secs"] is None:
+        STARTUP["first_response_secs"] = round(time.perf_counter() - _process_started, 3)
+        print(f"First response {STARTUP['first_response_secs']}s after start")
+
+
+def _warm_pool(pool):
+    """Open every idle connection of a pool and prepare the hot statements on it"""
+    conns = []
+    try:
+        for _ in range(database.POOL_SIZE):
+            conns.append(pool.getconn())
+        for conn in conns:
+            with conn.cursor() as cur:
+                statements.prepare_all(cur)
+            conn.commit()
+    finally:
+        for conn in conns:
+            pool.putconn(conn)
+
+
+def warm_up():
+    """Pre-open pools, prepare hot statements and fill the hot caches"""
+    started = time.perf_counter()
+
+    for pool in [database.primary, *database.replicas]:
+        try:
+            _warm_pool(pool)
+        except Exception as e:
+            if pool is database.primary:
+                raise
+            print(f"Skipping warm-up of {pool.name}: {str(e)}")
+
+    exams = cache.exams()
+    for exam in exams[:WARMUP_EXAMS]:
+        cache.answer_key(exam["exam_overview_id"])
+
+    STARTUP["warmup_secs"] = round(time.perf_counter() - started, 3)
+    STARTUP["ready"] = True
+    STARTUP["error"] = None
+    print(f"Warm-up finished in {STARTUP['warmup_secs']}s")
+
+
+def _retry_until_warm():
+    while not STARTUP["ready"]:
+        time.sleep(WARMUP_RETRY_SECS)
+        try:
+            warm_up()
+        except Exception as e:
+            STARTUP["error"] = str(e)
+
+
+def start():
+    """Warm up now; if the database isn't reachable yet keep retrying in the background"""
+    try:
+        warm_up()
+    except Exception as e:
+        STARTUP["error"] = str(e)
+        print(f"Warm-up failed, retrying in background: {str(e)}")
+        threading.Thread(target=_retry_until_warm, name="warmup-retry", daemon=True).start()